@@ -0,0 +1,211 @@
+"""Team box scores aggregated from staged player rows with numpy.
+
+Staged rows come in runs that share a (quarter, time) snapshot. Every row is
+given a bin for its (snapshot, team) pair, all stat columns are summed per
+bin in one pass, and team PIR is computed from the summed columns.
+
+When the player rows are written anyway, `team_snapshots_in_db` derives the
+same team rows inside the database instead, with one INSERT ... SELECT ...
+GROUP BY over the game's player rows. `python aggregate.py bench` compares
+the two.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+import numpy as np
+from sqlalchemy import case, create_engine, func, select
+
+
+TEAM_ORDER = ['gameid', 'season', 'quarter', 'time', 'elapsed_seconds', 'team',
+              'PIR', 'PTS', 'FGM', 'FGA', '3PM', '3PA', 'FTM', 'FTA', 'TREB',
+              'OREB', 'DREB', 'AST', 'STL', 'BLK', 'TO', 'PF', 'PFD',
+              'winning_team', 'winner']
+
+SUM_COLUMNS = ['PTS', 'FGM', 'FGA', '3PM', '3PA', 'FTM', 'FTA', 'TREB',
+               'OREB', 'DREB', 'AST', 'STL', 'BLK', 'TO', 'PF', 'PFD', 'BLKD']
+
+# Same terms as PerformanceMeasureCaclulator.calculate_pir.
+PIR_TERMS = {'PTS': 1, 'AST': 1, 'STL': 1, 'BLK': 1, 'PFD': 1, 'FGA': -1,
+             'FTA': -1, 'TO': -1, 'BLKD': -1, 'PF': -1}
+PIR_WEIGHTS = np.array([PIR_TERMS.get(column, 0) for column in SUM_COLUMNS])
+
+
+def snapshot_bins(rows, teams):
+    """Bin number of every row, with rows of the same snapshot and team in
+    the same bin, and the index of the first row of each snapshot."""
+    quarters = np.array([row['quarter'] for row in rows])
+    elapsed = np.array([row['elapsed_seconds'] for row in rows])
+    changed = np.ones(len(rows), dtype=bool)
+    changed[1:] = (quarters[1:] != quarters[:-1]) | (elapsed[1:] != elapsed[:-1])
+    snapshots = np.cumsum(changed) - 1
+    team_index = dict((team, i) for i, team in enumerate(teams))
+    sides = np.array([team_index[row['team']] for row in rows])
+    return snapshots * len(teams) + sides, np.flatnonzero(changed)
+
+
+def sum_by_bin(rows, bins, size):
+    stats = np.array([[row.get(column, 0) for column in SUM_COLUMNS]
+                      for row in rows], dtype=np.int64)
+    totals = np.zeros((size, len(SUM_COLUMNS)), dtype=np.int64)
+    for i in range(len(SUM_COLUMNS)):
+        totals[:, i] = np.bincount(bins, weights=stats[:, i], minlength=size)
+    return totals
+
+
+def team_snapshots(rows, home, away, gameid):
+    """Team rows, in `TEAM_ORDER`, for every snapshot."""
+    if not rows:
+        return []
+    # Iterating a dict keeps the team order earlier versions wrote rows in.
+    teams = list({home: None, away: None})
+    bins, starts = snapshot_bins(rows, teams)
+    totals = sum_by_bin(rows, bins, len(starts) * len(teams))
+    pir = totals.dot(PIR_WEIGHTS)
+    totals, pir = totals.tolist(), pir.tolist()
+
+    team_rows = []
+    for snapshot, start in enumerate(starts):
+        first = rows[start]
+        for side, team in enumerate(teams):
+            bin_ = snapshot * len(teams) + side
+            values = dict(zip(SUM_COLUMNS, totals[bin_]))
+            values.update({
+                'gameid': gameid,
+                'season': first.get('season', 0),
+                'quarter': first['quarter'],
+                'time': first['time'],
+                'elapsed_seconds': first['elapsed_seconds'],
+                'team': team,
+                'PIR': pir[bin_],
+                'winning_team': first['winner'],
+                'winner': 'home' if first['winner'] == home else 'away',
+            })
+            team_rows.append(OrderedDict(
+                (field, values[field]) for field in TEAM_ORDER))
+    return team_rows
+
+
+def team_snapshots_in_db(engine, player_table, team_table, gameid, home):
+    """Writes the team rows of a game whose player rows are already in
+    `player_table`, aggregating them in the database."""
+    rows = player_table
+    key = [rows.c.gameid, rows.c.season, rows.c.quarter,
+           rows.c.elapsed_seconds, rows.c.team]
+    sums = dict((column, func.sum(rows.c[column])) for column in SUM_COLUMNS)
+    pir = sum(func.coalesce(sums[column], 0) * weight
+              for column, weight in sorted(PIR_TERMS.items()))
+    winner = func.max(rows.c.winner)
+    values = dict(
+        [(column.name, column) for column in key] + list(sums.items()) + [
+            ('time', func.max(rows.c.time)),
+            ('PIR', pir),
+            ('winning_team', winner),
+            ('winner', case([(winner == home, 'home')], else_='away')),
+        ])
+    columns = [name for name in TEAM_ORDER if name in values]
+    query = select([values[name] for name in columns]).where(
+        rows.c.gameid == gameid).group_by(*key)
+    engine.execute(team_table.insert().from_select(columns, query))
+
+
+#############
+# BENCHMARK #
+#############
+
+def _synthetic_rows(gameid, home, away, snapshots, players=13):
+    """Player rows shaped like the writer's, with stats that only grow."""
+    rng = random.Random(gameid)
+    totals = dict(((team, i), dict((column, 0) for column in SUM_COLUMNS))
+                  for team in (home, away) for i in range(players))
+    rows = []
+    for elapsed in range(snapshots):
+        quarter = min(4, elapsed // 720 + 1)
+        for (team, i), stats in sorted(totals.items()):
+            if rng.random() < 0.02:
+                stats[rng.choice(SUM_COLUMNS)] += 1
+            row = dict(stats)
+            row.update({
+                'gameid': gameid, 'season': 0, 'quarter': quarter,
+                'elapsed_seconds': elapsed, 'time': '0:00',
+                'team': team, 'player': '{} {}'.format(team, i),
+                'in_game': i < 5, 'winner': home, 'home': team == home,
+            })
+            rows.append(row)
+    return rows
+
+
+def benchmark(games=3, snapshots=2880, uri=None):
+    """Times writing player rows plus team rows aggregated in Python against
+    writing player rows and aggregating them in the database."""
+    from db import create_schema, player_box_score, team_box_score
+
+    path = None
+    if uri is None:
+        handle, path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        uri = 'sqlite:///{}'.format(path)
+    engine = create_engine(uri)
+    create_schema(engine)
+    player_columns = set(player_box_score.c.keys())
+    results = {}
+    try:
+        for mode in ['python', 'database']:
+            timings = {'players': 0.0, 'teams': 0.0}
+            for gameid in range(1, games + 1):
+                rows = _synthetic_rows(gameid, 'HOM', 'AWY', snapshots)
+                with engine.begin() as conn:
+                    for table in [player_box_score, team_box_score]:
+                        conn.execute(table.delete().where(
+                            table.c.gameid == gameid))
+                start = time.time()
+                engine.execute(player_box_score.insert(), [
+                    dict((k, v) for k, v in row.items() if k in player_columns)
+                    for row in rows])
+                timings['players'] += time.time() - start
+                start = time.time()
+                if mode == 'python':
+                    engine.execute(team_box_score.insert(),
+                                   team_snapshots(rows, 'HOM', 'AWY', gameid))
+                else:
+                    team_snapshots_in_db(engine, player_box_score,
+                                         team_box_score, gameid, 'HOM')
+                timings['teams'] += time.time() - start
+            results[mode] = timings
+            print("{:>8}: player rows {:.2f}s, team rows {:.2f}s".format(
+                mode, timings['players'], timings['teams']))
+        print("{} games of {} snapshots on {}; team rows {}".format(
+            games, snapshots, engine.dialect.name,
+            "match" if _same_team_rows(engine, games, snapshots) else
+            "DIFFER"))
+    finally:
+        engine.dispose()
+        if path:
+            os.remove(path)
+    return results
+
+
+def _same_team_rows(engine, games, snapshots):
+    from db import team_box_score
+    query = select([team_box_score]).order_by(
+        *team_box_score.primary_key.columns)
+    database = [tuple(row) for row in engine.execute(query)]
+    rows = []
+    for gameid in range(1, games + 1):
+        rows += team_snapshots(
+            _synthetic_rows(gameid, 'HOM', 'AWY', snapshots), 'HOM', 'AWY',
+            gameid)
+    columns = [column.name for column in team_box_score.columns]
+    python = sorted(tuple(row[name] for name in columns) for row in rows)
+    return python == sorted(database)
+
+
+if __name__ == '__main__':
+    """Usage: python aggregate.py bench [games] [snapshots] [db uri]"""
+    if len(sys.argv) > 1 and sys.argv[1] == 'bench':
+        args = sys.argv[2:]
+        benchmark(*[int(arg) for arg in args[:2]],
+                  uri=args[2] if len(args) > 2 else None)
@@ -0,0 +1,104 @@
+"""Writes finished games to the database on a background thread.
+
+Building a game's box scores is CPU bound and writing them is I/O bound, so
+a backfill hands each finished game to an `AsyncWriter` and starts on the
+next one while the previous game is written. At most `maxsize` games wait to
+be written; `submit` blocks once that many are queued, so a slow database
+holds the scraper back instead of piling games up in memory.
+
+    with AsyncWriter(on_error=log) as writer:
+        for game in games:
+            game.compute()
+            writer.submit(game.gameid, game.write)
+
+Leaving the `with` block, normally or on an exception, waits until every
+submitted game has been written.
+"""
+import threading
+from Queue import Full, Queue
+
+
+_STOP = object()
+# How often a blocked `submit` or `close` checks the writer is still alive.
+POLL_SECONDS = 0.1
+
+
+class AsyncWriter(object):
+    """
+    :param maxsize: games that may wait to be written.
+    :param on_error: called with (key, exception) when a write fails; the
+        writer carries on with the next game, even if `on_error` raises.
+    """
+
+    def __init__(self, maxsize=2, on_error=None):
+        self.queue = Queue(maxsize)
+        self.on_error = on_error
+        self.thread = None
+        self.written = 0
+        self.failed = 0
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is _STOP:
+                    return
+                key, write = item
+                try:
+                    write()
+                    self.written += 1
+                except Exception as e:
+                    self.failed += 1
+                    self._report(key, e)
+            finally:
+                self.queue.task_done()
+
+    def _report(self, key, error):
+        if self.on_error is not None:
+            try:
+                self.on_error(key, error)
+                return
+            except Exception as e:
+                print("Handling the failed write of {} failed: {}".format(
+                    key, e))
+        print("Writing {} failed: {}".format(key, error))
+
+    def _put(self, item):
+        """Queues `item`, blocking while the queue is full, but gives up
+        with RuntimeError if the writer thread has died."""
+        while True:
+            if self.thread is None or not self.thread.is_alive():
+                raise RuntimeError("Writer is not running")
+            try:
+                self.queue.put(item, timeout=POLL_SECONDS)
+                return
+            except Full:
+                pass
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run)
+        self.thread.start()
+        return self
+
+    def submit(self, key, write):
+        """Queues `write` to be called on the writer thread, blocking while
+        the queue is full; raises RuntimeError if the thread has died."""
+        self._put((key, write))
+
+    def close(self):
+        """Writes everything submitted so far and stops the thread."""
+        if self.thread is None:
+            return
+        try:
+            self._put(_STOP)
+        except RuntimeError:
+            # The thread already died; there is nothing left to stop.
+            pass
+        self.thread.join()
+        self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,5 +1,6 @@
 from playbyplay import make_soup
 
+
 def get_point_diff(gameid):
     """Positive point diff favors home, negative away."""
     url = "http://espn.go.com/nba/playbyplay?gameId={}".format(gameid)
@@ -7,4 +8,6 @@ def get_point_diff(gameid):
     away_score, home_score = map(int, [div.text for div in divs])
     return home_score - away_score
 
-print(get_point_diff('400878160'))
+
+if __name__ == '__main__':
+    print(get_point_diff('400878160'))
@@ -1,13 +1,631 @@
 import os
+import re
 
 import dataset
+from sqlalchemy import (
+    Boolean, Column, Float, Index, Integer, MetaData, String, Table, Text,
+    event, inspect, select,
+)
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.pool import NullPool
+from sqlalchemy.schema import CreateTable
 
 
-__all__ = ["db", "per_table", "player_box_score_table"]
+__all__ = ["db", "per_table", "player_box_score_table", "team_box_score_table",
+           "game_table", "game_registry_table", "metadata", "create_schema",
+           "migrate", "insert_ignore", "delete_game_rows", "connect", "Lazy",
+           "season_of", "season_partition", "box_score_tables", "drop_season",
+           "team_box_score_all", "player_box_score_all", "dimension_ids",
+           "player_snapshots_wide"]
 
 
-db = dataset.connect(os.getenv("NBA_DB_URI", 'sqlite:///demo6.db'))
-per_table = db['PER_data']
-player_box_score_table = db['player_box_score']
-team_box_score_table = db['team_box_score']
-game_table = db['game_data']
+STAT_COLUMNS = ['PTS', 'FGM', 'FGA', '3PM', '3PA', 'FTM', 'FTA', 'TREB',
+                'OREB', 'DREB', 'AST', 'STL', 'BLK', 'TO', 'PF', 'PFD']
+
+metadata = MetaData()
+
+team_box_score = Table(
+    'team_box_score', metadata,
+    Column('gameid', Integer, primary_key=True, autoincrement=False),
+    Column('season', Integer, primary_key=True, autoincrement=False),
+    Column('quarter', Integer, primary_key=True, autoincrement=False),
+    Column('elapsed_seconds', Integer, primary_key=True, autoincrement=False),
+    Column('team', String(8), primary_key=True),
+    Column('time', String(5), nullable=False),
+    Column('PIR', Integer),
+    *[Column(stat, Integer) for stat in STAT_COLUMNS]
+)
+team_box_score.append_column(Column('winning_team', String(8)))
+team_box_score.append_column(Column('winner', String(4)))
+Index('ix_team_box_score_team_gameid', team_box_score.c.team,
+      team_box_score.c.gameid)
+
+player_box_score = Table(
+    'player_box_score', metadata,
+    Column('gameid', Integer, primary_key=True, autoincrement=False),
+    Column('season', Integer, primary_key=True, autoincrement=False),
+    Column('quarter', Integer, primary_key=True, autoincrement=False),
+    Column('elapsed_seconds', Integer, primary_key=True, autoincrement=False),
+    Column('player', String(64), primary_key=True),
+    Column('time', String(5), nullable=False),
+    Column('team', String(8), nullable=False),
+    Column('in_game', Boolean),
+    Column('uPER', Float),
+    Column('PIR', Float),
+    Column('MIN', Integer),
+    *[Column(stat, Integer) for stat in STAT_COLUMNS]
+)
+for column in [Column('BLKD', Integer), Column('home', Boolean),
+               Column('home_score', Integer), Column('away_score', Integer),
+               Column('winner', String(8)), Column('play', Text)]:
+    player_box_score.append_column(column)
+Index('ix_player_box_score_player_gameid', player_box_score.c.player,
+      player_box_score.c.gameid)
+Index('ix_player_box_score_team_gameid', player_box_score.c.team,
+      player_box_score.c.gameid)
+
+# One row per stretch of a game in which a team's players on court did not
+# change, and one row per player of each stretch, so lineup and on/off
+# queries read thousands of rows rather than every player snapshot.
+lineup_stints = Table(
+    'lineup_stints', metadata,
+    Column('gameid', Integer, primary_key=True, autoincrement=False),
+    Column('team', String(8), primary_key=True),
+    Column('stint', Integer, primary_key=True, autoincrement=False),
+    Column('home', Boolean),
+    Column('players', Integer),
+    Column('start_quarter', Integer, nullable=False),
+    Column('start_elapsed', Integer, nullable=False),
+    Column('end_elapsed', Integer, nullable=False),
+    Column('start_home_score', Integer),
+    Column('start_away_score', Integer),
+    Column('end_home_score', Integer),
+    Column('end_away_score', Integer),
+)
+
+stint_players = Table(
+    'stint_players', metadata,
+    Column('gameid', Integer, primary_key=True, autoincrement=False),
+    Column('team', String(8), primary_key=True),
+    Column('stint', Integer, primary_key=True, autoincrement=False),
+    Column('player', String(64), primary_key=True),
+)
+Index('ix_stint_players_player_gameid', stint_players.c.player,
+      stint_players.c.gameid)
+
+# Normalized layout of the player snapshots: the play text, clock and score
+# are stored once per snapshot in `snapshot_plays`, players and teams once in
+# their dimension tables, and each `player_snapshots` row only holds integer
+# keys and stats. The season comes from `game_registry`, like the partition a
+# wide row is written to. The `player_snapshots_wide` view joins them back
+# into rows shaped like `player_box_score`.
+players = Table(
+    'players', metadata,
+    Column('player_id', Integer, primary_key=True),
+    Column('name', String(64), nullable=False, unique=True),
+)
+
+teams = Table(
+    'teams', metadata,
+    Column('team_id', Integer, primary_key=True),
+    Column('name', String(8), nullable=False, unique=True),
+)
+
+snapshot_plays = Table(
+    'snapshot_plays', metadata,
+    Column('gameid', Integer, primary_key=True, autoincrement=False),
+    Column('quarter', Integer, primary_key=True, autoincrement=False),
+    Column('elapsed_seconds', Integer, primary_key=True, autoincrement=False),
+    Column('time', String(5), nullable=False),
+    Column('home_score', Integer),
+    Column('away_score', Integer),
+    Column('play', Text),
+)
+
+player_snapshots = Table(
+    'player_snapshots', metadata,
+    Column('gameid', Integer, primary_key=True, autoincrement=False),
+    Column('quarter', Integer, primary_key=True, autoincrement=False),
+    Column('elapsed_seconds', Integer, primary_key=True, autoincrement=False),
+    Column('player_id', Integer, primary_key=True, autoincrement=False),
+    Column('team_id', Integer, nullable=False),
+    Column('in_game', Boolean),
+    Column('uPER', Float),
+    Column('PIR', Float),
+    Column('MIN', Integer),
+    *[Column(stat, Integer) for stat in STAT_COLUMNS + ['BLKD']]
+)
+Index('ix_player_snapshots_player_gameid', player_snapshots.c.player_id,
+      player_snapshots.c.gameid)
+
+game_data = Table(
+    'game_data', metadata,
+    Column('gameid', Integer, primary_key=True, autoincrement=False),
+    Column('date', String(32)),
+    Column('location', String(128)),
+    Column('attendance', Integer),
+    Column('capacity', Integer),
+    Column('refs', Text),
+)
+
+game_registry = Table(
+    'game_registry', metadata,
+    Column('gameid', Integer, primary_key=True, autoincrement=False),
+    Column('season', Integer, nullable=False, index=True),
+    Column('date', String(32)),
+    Column('home', String(8)),
+    Column('away', String(8)),
+)
+
+crawled_schedules = Table(
+    'crawled_schedules', metadata,
+    Column('season', Integer, primary_key=True, autoincrement=False),
+    Column('team', String(8), primary_key=True),
+)
+
+play_events = Table(
+    'play_events', metadata,
+    Column('gameid', Integer, primary_key=True, autoincrement=False),
+    Column('seq', Integer, primary_key=True, autoincrement=False),
+    Column('quarter', Integer, nullable=False),
+    Column('time', String(5), nullable=False),
+    Column('elapsed_seconds', Integer, nullable=False),
+    Column('team', String(8)),
+    Column('play', Text),
+    Column('home_score', Integer),
+    Column('away_score', Integer),
+)
+
+game_rosters = Table(
+    'game_rosters', metadata,
+    Column('gameid', Integer, primary_key=True, autoincrement=False),
+    Column('team', String(8), primary_key=True),
+    Column('player', String(64), primary_key=True),
+    Column('position', Integer),
+    Column('starter', Integer),
+)
+
+parsed_games = Table(
+    'parsed_games', metadata,
+    Column('gameid', Integer, primary_key=True, autoincrement=False),
+    Column('home', String(8)),
+    Column('away', String(8)),
+    Column('winner', String(8)),
+    Column('rules_hash', String(40), index=True),
+    Column('stats_digest', String(40)),
+    # The writer options the game's snapshots were last written with, so a
+    # rebuild writes the same tables; NULL means the writer's defaults.
+    Column('granularity', String(16)),
+    Column('team_aggregation', String(16)),
+    Column('player_layout', String(16)),
+)
+
+work_queue = Table(
+    'work_queue', metadata,
+    Column('gameid', Integer, primary_key=True, autoincrement=False),
+    Column('status', String(8), nullable=False),
+    Column('owner', String(128)),
+    Column('lease_expires', Float),
+    Column('attempts', Integer, nullable=False, default=0),
+    Column('error', Text),
+)
+Index('ix_work_queue_status_lease', work_queue.c.status,
+      work_queue.c.lease_expires)
+
+# Realtime feed columns come from the feed's own header row, so only the
+# columns we always produce are declared; anything else is still added by
+# dataset on insert.
+per_data = Table(
+    'PER_data', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('gametime', String(16), index=True),
+    Column('TEAM', String(8), index=True),
+    Column('PER', Float),
+    Column('PIR', Float),
+)
+
+
+# Box score tables written by older versions of the scraper were created by
+# dataset and have no elapsed_seconds column, so it is derived from the clock.
+_LEGACY_CLOCK_SECONDS = (
+    "(SUBSTR(time, 1, INSTR(time, ':') - 1) + 0) * 60"
+    " + (SUBSTR(time, INSTR(time, ':') + 1) + 0)"
+)
+_LEGACY_ELAPSED_SECONDS = (
+    "CASE WHEN quarter <= 4 THEN quarter * 720 - ({0})"
+    " ELSE 2880 + (quarter - 4) * 300 - ({0}) END"
+).format(_LEGACY_CLOCK_SECONDS)
+# Rows written before box scores were partitioned take their season from the
+# registry; games that were never registered go in season 0.
+_LEGACY_SEASON = (
+    "COALESCE((SELECT season FROM game_registry"
+    " WHERE game_registry.gameid = {}.gameid), 0)"
+)
+
+
+def _needs_migration(inspector, table):
+    if table.name not in inspector.get_table_names():
+        return False
+    existing = inspector.get_pk_constraint(table.name)['constrained_columns']
+    return set(existing) != set(table.primary_key.columns.keys())
+
+
+def _migrate_table(engine, inspector, table):
+    legacy = "{}_legacy".format(table.name)
+    existing = set(col['name'] for col in inspector.get_columns(table.name))
+    quote = engine.dialect.identifier_preparer.quote
+    columns, select = [], []
+    for column in table.columns:
+        if column.name in existing:
+            columns.append(column.name)
+            select.append(quote(column.name))
+        elif column.name == 'elapsed_seconds':
+            columns.append(column.name)
+            select.append(_LEGACY_ELAPSED_SECONDS)
+        elif column.name == 'season':
+            columns.append(column.name)
+            select.append(_LEGACY_SEASON.format(quote(legacy)))
+    ignore = "OR IGNORE" if engine.dialect.name == 'sqlite' else "IGNORE"
+    with engine.begin() as conn:
+        conn.execute('ALTER TABLE {} RENAME TO {}'.format(
+            quote(table.name), quote(legacy)))
+        # SQLite keeps the renamed table's indexes under their old names, so
+        # the new ones can only be created once it is gone.
+        conn.execute(CreateTable(table))
+        conn.execute('INSERT {} INTO {} ({}) SELECT {} FROM {}'.format(
+            ignore, quote(table.name), ", ".join(map(quote, columns)),
+            ", ".join(select), quote(legacy)))
+        conn.execute('DROP TABLE {}'.format(quote(legacy)))
+        for index in table.indexes:
+            index.create(conn)
+
+
+def migrate(engine):
+    """Move dataset-created tables onto the typed schema.
+
+    Rows that collide on the new primary key (same player at the same second)
+    are dropped, which only ever discards the duplicate snapshots written by
+    older versions.
+    """
+    game_registry.create(engine, checkfirst=True)
+    inspector = inspect(engine)
+    for table in [team_box_score, player_box_score, game_data]:
+        if _needs_migration(inspector, table):
+            print("Migrating {}".format(table.name))
+            _migrate_table(engine, inspector, table)
+    inspector = inspect(engine)
+    _add_missing_columns(engine, inspector, parsed_games, parsed_games.name)
+    for table in PARTITIONED:
+        for name in [table.name] + _season_tables(engine, table):
+            _add_missing_columns(engine, inspector, table, name)
+
+
+def _add_missing_columns(engine, inspector, table, name):
+    """Adds columns declared since `name` was created; they are all
+    nullable, so existing rows just read NULL."""
+    if name not in inspector.get_table_names():
+        return
+    existing = set(col['name'] for col in inspector.get_columns(name))
+    quote = engine.dialect.identifier_preparer.quote
+    for column in table.columns:
+        if column.name not in existing:
+            engine.execute("ALTER TABLE {} ADD COLUMN {} {}".format(
+                quote(name), quote(column.name),
+                column.type.compile(engine.dialect)))
+
+
+def insert_ignore(engine, table, rows):
+    """Bulk insert `rows`, skipping any that already exist."""
+    if not rows:
+        return
+    prefix = "OR IGNORE" if engine.dialect.name == 'sqlite' else "IGNORE"
+    engine.execute(table.insert().prefix_with(prefix), rows)
+
+
+def dimension_ids(engine, table, names):
+    """{name: id} of `names` in the `players` or `teams` table, adding the
+    names it doesn't have yet."""
+    names = set(names)
+    if not names:
+        return {}
+    key = list(table.primary_key)[0]
+    insert_ignore(engine, table, [{"name": name} for name in names])
+    return dict(tuple(row) for row in engine.execute(
+        select([table.c.name, key]).where(table.c.name.in_(names))))
+
+
+def delete_game_rows(engine, gameid, tables=None):
+    """Removes everything written for a game so it can be written again.
+    Given a connection instead of an engine, the rows are deleted in the
+    connection's current transaction."""
+    if tables is None:
+        tables = [team_box_score, player_box_score, lineup_stints,
+                  stint_players, snapshot_plays, player_snapshots, game_data]
+    season = season_of(engine, gameid)
+    # Rows written before partitioning stay in the base table.
+    tables = tables + [season_partition(engine, table, season)
+                       for table in tables if table in PARTITIONED]
+    deletes = [table.delete().where(table.c.gameid == gameid)
+               for table in set(tables)]
+    if isinstance(engine, Connection):
+        for delete in deletes:
+            engine.execute(delete)
+        return
+    with engine.begin() as conn:
+        for delete in deletes:
+            conn.execute(delete)
+
+
+#######################
+# SEASON PARTITIONING #
+#######################
+
+# Box scores are split by season so inserts only touch one season's indexes
+# and a season can be rebuilt by dropping it. MySQL partitions the tables
+# themselves by LIST (season). Elsewhere each season gets its own copy of the
+# table, named like `team_box_score_2015`, and the base table only keeps rows
+# of unregistered games (season 0) and rows written before partitioning. The
+# `<table>_all` views read every partition on either backend.
+PARTITIONED = [team_box_score, player_box_score]
+
+partitions = MetaData()
+views = MetaData()
+_partitions = {}
+
+
+def _copy_table(table, name, metadata, indexes=True):
+    copy = Table(name, metadata, *[column.copy() for column in table.columns])
+    if indexes:
+        for index in table.indexes:
+            Index(index.name.replace(table.name, name, 1),
+                  *[copy.c[column.name] for column in index.columns])
+    return copy
+
+
+team_box_score_all = _copy_table(
+    team_box_score, 'team_box_score_all', views, indexes=False)
+player_box_score_all = _copy_table(
+    player_box_score, 'player_box_score_all', views, indexes=False)
+player_snapshots_wide = _copy_table(
+    player_box_score, 'player_snapshots_wide', views, indexes=False)
+
+# Where each `player_box_score` column comes from in the normalized layout;
+# the rest are columns of `player_snapshots` (s).
+_WIDE_SOURCES = {
+    'season': "COALESCE(r.season, 0)",
+    'player': "p.name",
+    'team': "t.name",
+    'time': "e.time",
+    'home': "t.name = g.home",
+    'home_score': "e.home_score",
+    'away_score': "e.away_score",
+    'winner': "g.winner",
+    'play': "e.play",
+}
+
+
+def season_of(engine, gameid):
+    row = engine.execute(select([game_registry.c.season]).where(
+        game_registry.c.gameid == gameid)).first()
+    return row[0] if row else 0
+
+
+def _has_table(bind, name):
+    # Connections have no `has_table` of their own.
+    return bind.run_callable(bind.dialect.has_table, name)
+
+
+def _season_tables(engine, table):
+    pattern = re.compile(r'^{}_(\d+)$'.format(re.escape(table.name)))
+    return sorted(name for name in inspect(engine).get_table_names()
+                  if pattern.match(name))
+
+
+def _replace_view(bind, view, definition, attempts=3):
+    """Drops `view` and creates it again as the SELECT `definition()`
+    returns. Workers adding seasons at once can both drop the view before
+    either creates it; the one whose CREATE fails tries again, reading the
+    tables that exist by then, so the view keeps both seasons."""
+    for attempt in range(attempts):
+        try:
+            if isinstance(bind, Connection):
+                _drop_and_create_view(bind, view, definition)
+            else:
+                with bind.begin() as conn:
+                    _drop_and_create_view(conn, view, definition)
+            return
+        except DBAPIError as e:
+            if ("already exists" not in str(e.orig)
+                    or attempt == attempts - 1):
+                raise
+
+
+def _drop_and_create_view(conn, view, definition):
+    conn.execute("DROP VIEW IF EXISTS {}".format(view))
+    conn.execute("CREATE VIEW {} AS {}".format(view, definition()))
+
+
+def _create_view(engine, table):
+    quote = engine.dialect.identifier_preparer.quote
+    columns = ", ".join(quote(column.name) for column in table.columns)
+
+    def definition():
+        names = [table.name]
+        if engine.dialect.name != 'mysql':
+            names += _season_tables(engine, table)
+        if table is player_box_score:
+            names.append(player_snapshots_wide.name)
+        return " UNION ALL ".join(
+            "SELECT {} FROM {}".format(columns, quote(name))
+            for name in names)
+    _replace_view(engine, quote("{}_all".format(table.name)), definition)
+
+
+def _create_wide_view(engine):
+    quote = engine.dialect.identifier_preparer.quote
+    columns = ", ".join("{} AS {}".format(
+        _WIDE_SOURCES.get(column.name, "s." + quote(column.name)),
+        quote(column.name)) for column in player_box_score.columns)
+    _replace_view(engine, "player_snapshots_wide", lambda: (
+        "SELECT {} FROM"
+        " player_snapshots s"
+        " JOIN players p ON p.player_id = s.player_id"
+        " JOIN teams t ON t.team_id = s.team_id"
+        " JOIN snapshot_plays e ON e.gameid = s.gameid"
+        " AND e.quarter = s.quarter"
+        " AND e.elapsed_seconds = s.elapsed_seconds"
+        " LEFT JOIN parsed_games g ON g.gameid = s.gameid"
+        " LEFT JOIN game_registry r ON r.gameid = s.gameid".format(columns)))
+
+
+def _mysql_partitions(engine, table):
+    return set(row[0] for row in engine.execute(
+        "SELECT PARTITION_NAME FROM information_schema.PARTITIONS"
+        " WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        table.name) if row[0])
+
+
+def _partition_mysql(engine, table):
+    """Partitions `table` by season, with a partition for every season it
+    already holds."""
+    if _mysql_partitions(engine, table):
+        return
+    seasons = set([0]) | set(row[0] for row in engine.execute(
+        select([table.c.season]).distinct()))
+    engine.execute("ALTER TABLE {} PARTITION BY LIST (season) ({})".format(
+        table.name, ", ".join("PARTITION p{0} VALUES IN ({0})".format(season)
+                              for season in sorted(seasons))))
+
+
+def season_partition(engine, table, season):
+    """The table `season`'s rows of `table` are written to, created on first
+    use."""
+    key = (table.name, season)
+    if key in _partitions:
+        return _partitions[key]
+    partition = table
+    if engine.dialect.name == 'mysql':
+        if "p{}".format(season) not in _mysql_partitions(engine, table):
+            engine.execute(
+                "ALTER TABLE {0} ADD PARTITION (PARTITION p{1} VALUES IN ({1}))"
+                .format(table.name, season))
+    elif season:
+        name = "{}_{}".format(table.name, season)
+        partition = partitions.tables.get(name)
+        if partition is None:
+            partition = _copy_table(table, name, partitions)
+        if not _has_table(engine, name):
+            partition.create(engine, checkfirst=True)
+            _create_view(engine, table)
+    _partitions[key] = partition
+    return partition
+
+
+def box_score_tables(gameid):
+    """Dataset handles of the (player, team) box score partitions a game's
+    rows are written to."""
+    season = season_of(db.engine, gameid)
+    return tuple(db[season_partition(db.engine, table, season).name]
+                 for table in [player_box_score, team_box_score])
+
+
+def drop_season(engine, season):
+    """Removes every box score row of a season so it can be written again."""
+    for table in PARTITIONED:
+        _partitions.pop((table.name, season), None)
+        if engine.dialect.name == 'mysql':
+            if "p{}".format(season) in _mysql_partitions(engine, table):
+                engine.execute("ALTER TABLE {} TRUNCATE PARTITION p{}".format(
+                    table.name, season))
+            continue
+        name = "{}_{}".format(table.name, season)
+        if season and _has_table(engine, name):
+            engine.execute("DROP TABLE {}".format(
+                engine.dialect.identifier_preparer.quote(name)))
+            _create_view(engine, table)
+        engine.execute(table.delete().where(table.c.season == season))
+    registered = select([game_registry.c.gameid])
+    for table in [snapshot_plays, player_snapshots]:
+        if season:
+            games = table.c.gameid.in_(
+                registered.where(game_registry.c.season == season))
+        else:
+            games = ~table.c.gameid.in_(registered)
+        engine.execute(table.delete().where(games))
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.close()
+
+
+def create_schema(engine):
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', _set_sqlite_pragmas)
+    migrate(engine)
+    metadata.create_all(engine)
+    existing = set(inspect(engine).get_view_names())
+    if player_snapshots_wide.name not in existing:
+        _create_wide_view(engine)
+        # Views made before the normalized layout don't read it yet.
+        existing.discard(player_box_score_all.name)
+    for table in PARTITIONED:
+        if engine.dialect.name == 'mysql':
+            _partition_mysql(engine, table)
+        if "{}_all".format(table.name) not in existing:
+            _create_view(engine, table)
+
+
+class Lazy(object):
+    """Stands in for an object that is only built on first use, so importing
+    a module never opens a database connection."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._target = None
+
+    @property
+    def loaded(self):
+        return self._target is not None
+
+    def _resolve(self):
+        if self._target is None:
+            self._target = self._factory()
+        return self._target
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __getitem__(self, key):
+        return self._resolve()[key]
+
+    def __iter__(self):
+        return iter(self._resolve())
+
+
+def connect():
+    uri = os.getenv("NBA_DB_URI", 'sqlite:///demo6.db')
+    engine_kwargs = {}
+    if uri.startswith('sqlite') and uri not in ('sqlite://',
+                                                'sqlite:///:memory:'):
+        # dataset shares one SQLite connection between all threads, which
+        # sqlite3 only lets the thread that opened it use; the background
+        # writer (and every server thread) needs its own.
+        engine_kwargs['poolclass'] = NullPool
+    database = dataset.connect(uri, reflect_metadata=False,
+                               engine_kwargs=engine_kwargs)
+    create_schema(database.engine)
+    return database
+
+
+db = Lazy(connect)
+per_table = Lazy(lambda: db['PER_data'])
+player_box_score_table = Lazy(lambda: db['player_box_score'])
+team_box_score_table = Lazy(lambda: db['team_box_score'])
+game_table = Lazy(lambda: db['game_data'])
+game_registry_table = Lazy(lambda: db['game_registry'])
@@ -0,0 +1,150 @@
+"""Parsed play-by-play kept in the database, so games can be rebuilt without
+scraping ESPN again.
+
+Each game's events, roster and starters are stored the first time it is
+scraped, stamped with the hash of the classifier rules in `pbp_methods` and a
+digest of what those rules made of every play. When the rules change, only
+the games whose digest changes need their snapshots rebuilt.
+"""
+import hashlib
+import json
+
+from sqlalchemy import select
+
+from db import db, game_rosters, parsed_games, play_events
+from gameclock import elapsed_seconds
+from pbp_methods import METHODS, rules_hash
+
+
+def classify(play):
+    for method in METHODS:
+        stats = method(play)
+        if stats:
+            return stats
+
+
+def classification_digest(pbp):
+    digest = hashlib.sha1()
+    for play in pbp:
+        digest.update(json.dumps(classify(play['play']), sort_keys=True)
+                      .encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def store_parsed_game(gameid, pbp, home, away, winner, roster, starters):
+    events = [{
+        "gameid": gameid,
+        "seq": seq,
+        "quarter": play['quarter'],
+        "time": play['time'],
+        "elapsed_seconds": elapsed_seconds(play['quarter'], play['time']),
+        "team": play['team'],
+        "play": play['play'],
+        "home_score": play['home_score'],
+        "away_score": play['away_score'],
+    } for seq, play in enumerate(pbp)]
+    players = {}
+    for team, names in roster.items():
+        for position, name in enumerate(names):
+            players[(team, name)] = {
+                "gameid": gameid, "team": team, "player": name,
+                "position": position, "starter": None}
+    teams = dict((name, team) for team, name in players)
+    for order, name in enumerate(starters):
+        # Starters whose name doesn't match the roster are kept without a team.
+        key = (teams.get(name, ''), name)
+        players.setdefault(key, {"gameid": gameid, "team": key[0],
+                                 "player": name, "position": None})
+        players[key]["starter"] = order
+    with db.engine.begin() as conn:
+        for table in [play_events, game_rosters, parsed_games]:
+            conn.execute(table.delete().where(table.c.gameid == gameid))
+        conn.execute(play_events.insert(), events)
+        if players:
+            conn.execute(game_rosters.insert(), list(players.values()))
+        conn.execute(parsed_games.insert(), {
+            "gameid": gameid, "home": home, "away": away, "winner": winner,
+            "rules_hash": rules_hash(),
+            "stats_digest": classification_digest(pbp)})
+
+
+def load_events(gameid, home=None):
+    query = select([play_events]).where(
+        play_events.c.gameid == gameid).order_by(play_events.c.seq)
+    pbp = []
+    for row in db.engine.execute(query):
+        pbp.append({
+            "time": row['time'],
+            "quarter": row['quarter'],
+            "play": row['play'],
+            "team": row['team'],
+            "home": row['team'] == home,
+            "away": home is not None and row['team'] != home,
+            "home_score": row['home_score'],
+            "away_score": row['away_score'],
+        })
+    return pbp
+
+
+def load_parsed_game(gameid):
+    """Returns the stored parse of a game in the shape the writer builds from
+    ESPN, or None if the game was never stored."""
+    game = db.engine.execute(select([parsed_games]).where(
+        parsed_games.c.gameid == gameid)).first()
+    if game is None:
+        return None
+    roster, starters = {}, []
+    query = select([game_rosters]).where(
+        game_rosters.c.gameid == gameid).order_by(game_rosters.c.position)
+    for row in db.engine.execute(query):
+        if row['team']:
+            roster.setdefault(row['team'], [])
+            roster[row['team']].append(row['player'])
+        if row['starter'] is not None:
+            starters.append((row['starter'], row['player']))
+    return {
+        "pbp": load_events(gameid, game['home']),
+        "home": game['home'],
+        "away": game['away'],
+        "winner": game['winner'],
+        "roster": roster,
+        "starters": [name for _, name in sorted(starters)],
+    }
+
+
+def stale_games():
+    """(gameid, stored digest) for games parsed under other rules."""
+    query = select([parsed_games.c.gameid, parsed_games.c.stats_digest]).where(
+        parsed_games.c.rules_hash != rules_hash())
+    return [tuple(row) for row in db.engine.execute(query)]
+
+
+def reclassify(gameid):
+    return gameid, classification_digest(load_events(gameid))
+
+
+def stamp(gameid, digest):
+    db.engine.execute(parsed_games.update().where(
+        parsed_games.c.gameid == gameid).values(
+        rules_hash=rules_hash(), stats_digest=digest))
+
+
+def written_options(gameid):
+    """The writer keyword arguments a stored game was last written with,
+    leaving out any it was written with before they were recorded."""
+    columns = [parsed_games.c.granularity, parsed_games.c.team_aggregation,
+               parsed_games.c.player_layout]
+    row = db.engine.execute(select(columns).where(
+        parsed_games.c.gameid == gameid)).first()
+    if row is None:
+        return {}
+    return dict((column.name, row[column.name]) for column in columns
+                if row[column.name] is not None)
+
+
+def reset_connections():
+    """Pool initializer; forked workers must not share the parent's sockets
+    or SQLite handles."""
+    if db.loaded:
+        db.engine.dispose()
@@ -0,0 +1,292 @@
+"""Paced HTTP fetching shared by every scraper in the project.
+
+Every request goes through a `FetchScheduler`, which keeps per-host state:
+
+* a token bucket limiting the request rate,
+* a concurrency limit that grows while responses are fast and clean and
+  shrinks on slow responses, errors and 429s (additive increase,
+  multiplicative decrease),
+* a backoff window shared by every thread talking to a throttled host.
+
+Waiting requests are admitted in priority order, so live games (`LIVE`) go
+ahead of historical backfill (`BACKFILL`).
+"""
+import heapq
+import itertools
+import random
+import socket
+import sys
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+from SocketServer import ThreadingMixIn
+from urllib2 import HTTPError, URLError, build_opener
+from urlparse import urlparse
+
+
+LIVE = 0
+BACKFILL = 1
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+FetchResult = namedtuple("FetchResult", ["url", "status", "body", "latency"])
+
+
+class FetchError(Exception):
+    pass
+
+
+class TokenBucket(object):
+    def __init__(self, rate, burst, min_rate, max_rate):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.tokens = burst
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Takes a token and returns how long to wait before using it."""
+        with self.lock:
+            now = time.time()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+    def try_acquire(self):
+        """Takes a token only if one is available right now."""
+        with self.lock:
+            now = time.time()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def scale(self, factor):
+        with self.lock:
+            self.rate = max(self.min_rate, min(self.max_rate,
+                                               self.rate * factor))
+
+
+class HostState(object):
+    def __init__(self, scheduler):
+        self.bucket = TokenBucket(scheduler.rate, scheduler.burst,
+                                  scheduler.min_rate, scheduler.max_rate)
+        self.limit = float(scheduler.initial_concurrency)
+        self.in_flight = 0
+        self.latency = None
+        self.error_rate = 0.0
+        self.backoff_until = 0
+        self.waiting = []
+        self.condition = threading.Condition()
+
+
+class FetchScheduler(object):
+    """Fetches urls with per-host pacing, adaptive concurrency and retries.
+
+    :param rate: starting requests per second allowed to each host.
+    :param target_latency: seconds; slower responses shrink concurrency.
+    :param opener: a urllib2 opener, replaceable for local stand-ins.
+    """
+
+    def __init__(self, rate=2.0, burst=4, min_rate=0.1, max_rate=20.0,
+                 initial_concurrency=2, max_concurrency=16,
+                 target_latency=2.0, max_retries=6, base_backoff=1.0,
+                 max_backoff=60.0, timeout=30, opener=None):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.initial_concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.opener = opener or build_opener()
+        self.hosts = {}
+        self.lock = threading.Lock()
+        self.sequence = itertools.count()
+
+    def host(self, url):
+        name = urlparse(url).netloc
+        with self.lock:
+            if name not in self.hosts:
+                self.hosts[name] = HostState(self)
+            return self.hosts[name]
+
+    def fetch(self, url, priority=BACKFILL):
+        host = self.host(url)
+        for attempt in range(self.max_retries + 1):
+            self._acquire(host, priority)
+            try:
+                result, retry_after = self._request(url)
+            finally:
+                self._release(host)
+            if result is not None:
+                self._record_success(host, result.latency)
+                return result
+            self._record_failure(host, attempt, retry_after)
+        raise FetchError("Gave up on {} after {} attempts".format(
+            url, self.max_retries + 1))
+
+    def _request(self, url):
+        """Returns (result, None) on success or (None, retry_after) when the
+        request should be retried."""
+        start = time.time()
+        try:
+            res = self.opener.open(url, timeout=self.timeout)
+            body = res.read()
+        except HTTPError as e:
+            if e.code not in RETRY_STATUSES:
+                raise FetchError("{} returned {}".format(url, e.code))
+            return None, e.headers.get('Retry-After')
+        except (URLError, socket.timeout, socket.error):
+            return None, None
+        latency = time.time() - start
+        return FetchResult(res.geturl(), res.getcode(), body, latency), None
+
+    def _acquire(self, host, priority):
+        ticket = (priority, next(self.sequence))
+        with host.condition:
+            heapq.heappush(host.waiting, ticket)
+            while True:
+                pause = host.backoff_until - time.time()
+                ready = (host.waiting[0] == ticket and
+                         host.in_flight < int(host.limit))
+                if ready and pause <= 0:
+                    break
+                host.condition.wait(pause if ready else 1.0)
+            heapq.heappop(host.waiting)
+            host.in_flight += 1
+            host.condition.notify_all()
+        time.sleep(host.bucket.reserve())
+
+    def _release(self, host):
+        with host.condition:
+            host.in_flight -= 1
+            host.condition.notify_all()
+
+    def _record_success(self, host, latency):
+        with host.condition:
+            if host.latency is None:
+                host.latency = latency
+            host.latency = 0.8 * host.latency + 0.2 * latency
+            host.error_rate *= 0.8
+            if host.latency > self.target_latency:
+                host.limit = max(1.0, host.limit * 0.75)
+            elif host.error_rate < 0.05:
+                host.limit = min(self.max_concurrency,
+                                 host.limit + 1.0 / host.limit)
+                host.bucket.scale(1.05)
+            host.condition.notify_all()
+
+    def _record_failure(self, host, attempt, retry_after):
+        delay = random.uniform(0, min(
+            self.max_backoff, self.base_backoff * 2 ** attempt))
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        with host.condition:
+            host.error_rate = 0.8 * host.error_rate + 0.2
+            host.limit = max(1.0, host.limit / 2)
+            host.backoff_until = max(host.backoff_until, time.time() + delay)
+        host.bucket.scale(0.7)
+
+
+_scheduler = None
+
+
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = FetchScheduler()
+    return _scheduler
+
+
+def set_scheduler(scheduler):
+    global _scheduler
+    _scheduler = scheduler
+
+
+def fetch(url, priority=BACKFILL):
+    return get_scheduler().fetch(url, priority)
+
+
+###################
+# LOCAL STAND-IN  #
+###################
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    """A local HTTP server that behaves like a host under load: every
+    response is delayed by `latency` +/- `jitter` seconds and anything over
+    `rate` requests per second gets a 429."""
+    daemon_threads = True
+
+    def __init__(self, latency=0.2, jitter=0.1, rate=5.0, port=0):
+        HTTPServer.__init__(self, ('127.0.0.1', port), StandInHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.bucket = TokenBucket(rate, rate, rate, rate)
+        self.served = 0
+        self.throttled = 0
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}/".format(self.server_address[1])
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        if not server.bucket.try_acquire():
+            server.throttled += 1
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+            self.end_headers()
+            return
+        time.sleep(max(0, random.gauss(server.latency, server.jitter)))
+        server.served += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.end_headers()
+        self.wfile.write("<html><body>{}</body></html>".format(self.path))
+
+    def log_message(self, *args):
+        pass
+
+
+def run_stand_in(requests=200, server_rate=5.0, latency=0.2, threads=32):
+    server = StandInServer(latency=latency, rate=server_rate)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    scheduler = FetchScheduler(rate=server_rate * 4, base_backoff=0.5)
+    urls = ["{}{}".format(server.url, i) for i in range(requests)]
+    start = time.time()
+    pool = ThreadPool(threads)
+    results = pool.map(lambda url: scheduler.fetch(url), urls)
+    pool.close()
+    elapsed = time.time() - start
+    host = scheduler.host(server.url)
+    print("{} requests in {:.1f}s ({:.1f}/s, server allows {}/s)".format(
+        len(results), elapsed, len(results) / elapsed, server_rate))
+    print("429s served: {}, final rate: {:.2f}/s, final concurrency: "
+          "{:.1f}".format(server.throttled, host.bucket.rate, host.limit))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    """Usage: python fetch.py [requests] [server_rate] [latency]"""
+    args = [float(arg) for arg in sys.argv[1:]]
+    run_stand_in(int(args[0]) if args else 200, *args[1:])
@@ -0,0 +1,32 @@
+"""Conversions between the play-by-play game clock and elapsed seconds."""
+
+QUARTER_SECONDS = 12 * 60
+OVERTIME_SECONDS = 5 * 60
+REGULATION_SECONDS = 4 * QUARTER_SECONDS
+
+
+def period_length(quarter):
+    return QUARTER_SECONDS if quarter <= 4 else OVERTIME_SECONDS
+
+
+def period_start(quarter):
+    """Elapsed seconds at the start of `quarter`."""
+    if quarter <= 4:
+        return (quarter - 1) * QUARTER_SECONDS
+    return REGULATION_SECONDS + (quarter - 5) * OVERTIME_SECONDS
+
+
+def clock_seconds(time):
+    minutes, seconds = map(int, time.split(':'))
+    return minutes * 60 + seconds
+
+
+def elapsed_seconds(quarter, time):
+    """Seconds since tip-off for a `quarter` and a "M:SS" clock `time`."""
+    return period_start(quarter) + period_length(quarter) - clock_seconds(time)
+
+
+def clock_time(quarter, elapsed):
+    """Inverse of `elapsed_seconds`, formatted like the play-by-play."""
+    remaining = period_start(quarter) + period_length(quarter) - elapsed
+    return "{}:{:02d}".format(remaining // 60, remaining % 60)
@@ -0,0 +1,265 @@
+"""Pushes live box scores and win probabilities to subscribers over
+Server-Sent Events.
+
+The current snapshot of every live game is kept in memory. Publishing a
+snapshot that differs from the current one wakes the game's subscribers; an
+unchanged snapshot is dropped. Each subscriber only holds the newest
+unsent snapshot per game, so a slow client skips intermediate updates
+instead of queueing them, and a client that stops reading is disconnected
+once a write blocks for `SEND_TIMEOUT` seconds.
+
+    GET /games              current snapshot of every game, as json
+    GET /events[?game=ID]   stream of snapshots for one or all games
+"""
+import json
+import math
+import select
+import socket
+import sys
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from urlparse import parse_qs, urlparse
+
+from gameclock import (
+    REGULATION_SECONDS, elapsed_seconds, period_length, period_start,
+)
+
+
+SEND_TIMEOUT = 10
+KEEPALIVE = 15
+
+# Standard deviation, in points, of an NBA final score margin around its
+# expectation; the margin is modelled as Brownian motion over the game.
+MARGIN_SIGMA = 13.0
+
+
+def win_probability(home_margin, seconds_remaining):
+    """Probability the home team wins, leading by `home_margin` points with
+    `seconds_remaining` to play."""
+    if seconds_remaining <= 0:
+        return 1.0 if home_margin > 0 else 0.0 if home_margin < 0 else 0.5
+    spread = MARGIN_SIGMA * math.sqrt(
+        float(seconds_remaining) / REGULATION_SECONDS)
+    return 0.5 * (1 + math.erf(home_margin / (spread * math.sqrt(2))))
+
+
+def seconds_remaining(quarter, time):
+    """Seconds left in regulation, or in the current overtime."""
+    end = max(REGULATION_SECONDS, period_start(quarter) + period_length(quarter))
+    return max(0, end - elapsed_seconds(quarter, time))
+
+
+def game_snapshot(home, away, stats, quarter=None, time=None):
+    """The pushed state of a game, from realtime's per-team player stats.
+    Without a game clock there is no win probability."""
+    stats = dict((team, stats.get(team, [])) for team in (home, away))
+    scores = dict((team, sum(player.get('PTS', 0) for player in stats[team]))
+                  for team in (home, away))
+    return {
+        "home": home,
+        "away": away,
+        "quarter": quarter,
+        "time": time,
+        "home_score": scores[home],
+        "away_score": scores[away],
+        "home_win_probability": None if quarter is None else win_probability(
+            scores[home] - scores[away], seconds_remaining(quarter, time)),
+        "players": stats,
+    }
+
+
+class Subscriber(object):
+    def __init__(self, game=None):
+        self.game = game
+        self.pending = {}
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+
+    def offer(self, game, payload):
+        with self.lock:
+            if game in self.pending:
+                self.dropped += 1
+            self.pending[game] = payload
+            self.ready.set()
+
+    def take(self, timeout):
+        """Waits up to `timeout` seconds and returns the pending payloads."""
+        self.ready.wait(timeout)
+        with self.lock:
+            payloads = list(self.pending.values())
+            self.pending = {}
+            self.ready.clear()
+        return payloads
+
+
+class LiveState(object):
+    def __init__(self):
+        self.snapshots = {}
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def publish(self, game, snapshot):
+        """Stores `snapshot` and pushes it if it changed; returns whether it
+        did."""
+        message = json.dumps(dict(snapshot, game=game), sort_keys=True)
+        with self.lock:
+            if self.snapshots.get(game) == message:
+                return False
+            self.snapshots[game] = message
+            subscribers = [subscriber for subscriber in self.subscribers
+                           if subscriber.game in (None, game)]
+        for subscriber in subscribers:
+            subscriber.offer(game, message)
+        return True
+
+    def subscribe(self, game=None):
+        subscriber = Subscriber(game)
+        with self.lock:
+            self.subscribers.add(subscriber)
+            current = [(name, message) for name, message
+                       in self.snapshots.items() if game in (None, name)]
+        for name, message in current:
+            subscriber.offer(name, message)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+
+class PushHandler(BaseHTTPRequestHandler):
+    timeout = SEND_TIMEOUT
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/games':
+            self.send_games()
+        elif url.path == '/events':
+            game = parse_qs(url.query).get('game', [None])[0]
+            self.stream(game)
+        else:
+            self.send_error(404)
+
+    def send_games(self):
+        with self.server.state.lock:
+            messages = list(self.server.state.snapshots.values())
+        body = "[{}]".format(",".join(messages))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream(self, game):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        subscriber = self.server.state.subscribe(game)
+        try:
+            while not self.server.stopping:
+                payloads = subscriber.take(KEEPALIVE)
+                if payloads:
+                    self.wfile.write("".join(
+                        "event: snapshot\ndata: {}\n\n".format(payload)
+                        for payload in payloads))
+                else:
+                    self.wfile.write(": keepalive\n\n")
+                self.wfile.flush()
+        except (socket.error, socket.timeout):
+            pass  # Client went away or stopped reading.
+        finally:
+            self.server.state.unsubscribe(subscriber)
+
+    def log_message(self, *args):
+        pass
+
+
+class PushServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 4096
+
+    def __init__(self, port=8765, host='127.0.0.1', state=None):
+        HTTPServer.__init__(self, (host, port), PushHandler)
+        self.state = state or LiveState()
+        self.stopping = False
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.stopping = True
+        self.shutdown()
+
+
+#############
+# BENCHMARK #
+#############
+
+def _connect(port, game):
+    sock = socket.create_connection(('127.0.0.1', port))
+    sock.sendall("GET /events?game={} HTTP/1.0\r\n\r\n".format(game))
+    return sock
+
+
+def benchmark(subscribers=1000, updates=50, interval=0.05, port=0):
+    """Connects `subscribers` local clients to one game, publishes `updates`
+    snapshots, and reports publish-to-receive latency across all clients."""
+    threading.stack_size(256 * 1024)
+    server = PushServer(port=port).start()
+    port = server.server_address[1]
+    sockets = dict((sock.fileno(), sock) for sock in
+                   [_connect(port, 'bench') for _ in range(subscribers)])
+    while len(server.state.subscribers) < subscribers:
+        time.sleep(0.05)
+    poller = select.poll()
+    for fileno in sockets:
+        poller.register(fileno, select.POLLIN)
+    buffers = dict((fileno, "") for fileno in sockets)
+    latencies = []
+    sent = {}
+
+    def receive(deadline):
+        while time.time() < deadline:
+            for fileno, _ in poller.poll(10):
+                data = sockets[fileno].recv(65536)
+                now = time.time()
+                buffers[fileno] += data
+                messages = buffers[fileno].split("\n\n")
+                buffers[fileno] = messages.pop()
+                for message in messages:
+                    if message.startswith("event: snapshot"):
+                        body = json.loads(message.split("data: ", 1)[1])
+                        latencies.append(now - sent[body['update']])
+
+    for i in range(updates):
+        sent[i] = time.time()
+        server.state.publish('bench', {"update": i})
+        receive(time.time() + interval)
+    receive(time.time() + 1)
+    server.stop()
+    for sock in sockets.values():
+        sock.close()
+
+    latencies.sort()
+    expected = subscribers * updates
+    print("{} subscribers, {} updates: received {} of {} ({} conflated)"
+          .format(subscribers, updates, len(latencies), expected,
+                  expected - len(latencies)))
+    if latencies:
+        print("latency ms: p50 {:.1f}  p99 {:.1f}  max {:.1f}".format(
+            latencies[len(latencies) // 2] * 1000,
+            latencies[int(len(latencies) * 0.99)] * 1000,
+            latencies[-1] * 1000))
+
+
+if __name__ == '__main__':
+    """Usage: python livepush.py bench [subscribers] [updates]"""
+    if len(sys.argv) > 1 and sys.argv[1] == 'bench':
+        benchmark(*[int(arg) for arg in sys.argv[2:4]])
@@ -0,0 +1,175 @@
+"""Command line entry point for every job in the project.
+
+Each subcommand imports only its own module when it runs, and the modules
+themselves connect to the database and create HTTP schedulers on first use,
+so starting a command (or a pool worker) costs only the imports it needs.
+
+    python nba_pbp.py backfill [--enqueue | --worker] [--debug]
+                               [--granularity second|event|period|N]
+                               [--team-aggregation python|database]
+                               [--player-layout wide|normalized]
+    python nba_pbp.py crawl [first_season] [last_season] [--refresh]
+    python nba_pbp.py reprocess [--processes N]
+    python nba_pbp.py rebuild <season>
+    python nba_pbp.py realtime [--home TEAM --away TEAM [--port PORT]]
+    python nba_pbp.py replay <gameid> [gameid ...] [--speed N]
+    python nba_pbp.py export <path>
+    python nba_pbp.py stress [--games N] [--overtimes N] [--sub-rate R]
+                             [--play-length N] [--first-gameid N]
+                             [--write] [--profile]
+
+Pass --timings before the subcommand to print how long startup took.
+"""
+import time
+
+STARTED = time.time()
+
+import argparse
+import importlib
+
+
+def backfill(args, playbyplay):
+    if args.enqueue:
+        playbyplay.enqueue_gameids()
+    elif args.worker:
+        playbyplay.work_from_queue(granularity=args.granularity,
+                                   team_aggregation=args.team_aggregation,
+                                   player_layout=args.player_layout)
+    else:
+        playbyplay.write_many(None, debug=args.debug,
+                              granularity=args.granularity,
+                              team_aggregation=args.team_aggregation,
+                              player_layout=args.player_layout)
+
+
+def crawl(args, valid_gameids):
+    seasons = range(args.first_season, args.last_season + 1)
+    valid_gameids.crawl(seasons, refresh=seasons if args.refresh else ())
+
+
+def reprocess(args, playbyplay):
+    playbyplay.reprocess(args.processes)
+
+
+def rebuild(args, playbyplay):
+    playbyplay.rebuild_season(args.season)
+
+
+def realtime(args, realtime):
+    if args.home and args.away:
+        realtime.watch(args.home, args.away, args.interval, args.port)
+    else:
+        realtime.write_data(realtime.get_scores())
+
+
+def replay(args, replay):
+    replay.run(args.gameids, speed=args.speed, interval=args.interval)
+
+
+def export(args, tensors):
+    print(tensors.export(args.path, seed=args.seed))
+
+
+def stress(args, synthetic):
+    synthetic.stress(args.games, seed=args.seed, write=args.write,
+                     profile=args.profile, overtimes=args.overtimes,
+                     sub_rate=args.sub_rate, play_length=args.play_length,
+                     first_gameid=args.first_gameid or synthetic.FIRST_GAMEID)
+
+
+def parser():
+    parser = argparse.ArgumentParser(description="NBA play-by-play scraper")
+    parser.add_argument('--timings', action='store_true',
+                        help="print startup time")
+    commands = parser.add_subparsers()
+
+    command = commands.add_parser('backfill', help="write historical games")
+    mode = command.add_mutually_exclusive_group()
+    mode.add_argument('--enqueue', action='store_true',
+                      help="add every known game to the work queue")
+    mode.add_argument('--worker', action='store_true',
+                      help="process games from the work queue")
+    command.add_argument('--debug', action='store_true',
+                         help="print plays that produce no stats")
+    command.add_argument('--granularity', default='second',
+                         help="second, event, period or a number of seconds")
+    command.add_argument('--team-aggregation', default='python',
+                         choices=['python', 'database'],
+                         help="where team snapshots are summed; 'database' "
+                              "also writes player snapshots")
+    command.add_argument('--player-layout', default='wide',
+                         choices=['wide', 'normalized'],
+                         help="write player snapshots to player_box_score "
+                              "or to the normalized player_snapshots")
+    command.set_defaults(func=backfill, module='playbyplay')
+
+    command = commands.add_parser('crawl', help="register game ids")
+    command.add_argument('first_season', type=int, nargs='?', default=2007)
+    command.add_argument('last_season', type=int, nargs='?', default=2016)
+    command.add_argument('--refresh', action='store_true')
+    command.set_defaults(func=crawl, module='valid_gameids')
+
+    command = commands.add_parser(
+        'reprocess', help="rebuild games affected by classifier changes")
+    command.add_argument('--processes', type=int, default=None)
+    command.set_defaults(func=reprocess, module='playbyplay')
+
+    command = commands.add_parser(
+        'rebuild', help="drop a season's box scores and rewrite stored games")
+    command.add_argument('season', type=int)
+    command.set_defaults(func=rebuild, module='playbyplay')
+
+    command = commands.add_parser('realtime', help="record live stats")
+    command.add_argument('--home', help="keep polling and push this game")
+    command.add_argument('--away')
+    command.add_argument('--interval', type=float, default=5)
+    command.add_argument('--port', type=int, default=8765)
+    command.set_defaults(func=realtime, module='realtime')
+
+    command = commands.add_parser(
+        'replay', help="load-test realtime with stored games")
+    command.add_argument('gameids', type=int, nargs='+')
+    command.add_argument('--speed', type=float, default=100)
+    command.add_argument('--interval', type=float, default=1)
+    command.set_defaults(func=replay, module='replay')
+
+    command = commands.add_parser('export', help="write the training tensor")
+    command.add_argument('path')
+    command.add_argument('--seed', type=int, default=0)
+    command.set_defaults(func=export, module='tensors')
+
+    command = commands.add_parser(
+        'stress', help="run synthetic games through the writer")
+    command.add_argument('--games', type=int, default=1000)
+    command.add_argument('--seed', type=int, default=0)
+    command.add_argument('--first-gameid', type=int, default=None,
+                         help="gameid of the first game (default: 900000000)")
+    command.add_argument('--overtimes', type=int, default=None,
+                         help="overtimes in every game (default: random)")
+    command.add_argument('--sub-rate', type=float, default=1.0,
+                         help="substitutions per minute of game clock")
+    command.add_argument('--play-length', type=int, default=0,
+                         help="pad plays to at least this many characters")
+    command.add_argument('--write', action='store_true',
+                         help="also write every game to the database")
+    command.add_argument('--profile', action='store_true')
+    command.set_defaults(func=stress, module='synthetic')
+    return parser
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    start = time.time()
+    module = importlib.import_module(args.module)
+    if args.timings:
+        print("Started in {:.0f}ms ({} imported in {:.0f}ms)".format(
+            (time.time() - STARTED) * 1000, args.module,
+            (time.time() - start) * 1000))
+    start = time.time()
+    args.func(args, module)
+    if args.timings:
+        print("Ran in {:.1f}s".format(time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
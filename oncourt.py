@@ -0,0 +1,84 @@
+"""Who is on court, kept as one bitmask per team.
+
+Every player gets a slot (a bit) in their team's masks the first time they
+are seen, so checking, adding and removing a player are single bit
+operations, and a snapshot of the lineups is a small dict of ints.
+"""
+
+
+class OnCourt(object):
+    """
+    :param roster: {team: [player, ...]}; each player's slot is their index.
+    :param starters: players on court at tip-off.
+    """
+
+    def __init__(self, roster, starters=()):
+        self.slots = {}
+        self.players = {}
+        self.on = {}
+        self.played = {}
+        for team, players in roster.items():
+            for player in players:
+                self._slot(player, team)
+        for player in starters:
+            self.enter(player)
+
+    def _slot(self, player, team=None):
+        """(team, bit) of `player`, giving them a slot on `team` if they
+        don't have one yet."""
+        if player not in self.slots:
+            players = self.players.setdefault(team, [])
+            self.on.setdefault(team, 0)
+            self.played.setdefault(team, 0)
+            self.slots[player] = (team, 1 << len(players))
+            players.append(player)
+        return self.slots[player]
+
+    def __contains__(self, player):
+        if player not in self.slots:
+            return False
+        team, bit = self.slots[player]
+        return bool(self.on[team] & bit)
+
+    def __iter__(self):
+        for team, mask in self.on.items():
+            for player in self.decode(team, mask):
+                yield player
+
+    def decode(self, team, mask):
+        """The players of `team` whose bits are set in `mask`."""
+        return [player for i, player in enumerate(self.players.get(team, []))
+                if mask >> i & 1]
+
+    def enter(self, player, team=None):
+        """Puts `player` on court; returns False if they already were."""
+        team, bit = self._slot(player, team)
+        if self.on[team] & bit:
+            return False
+        self.on[team] |= bit
+        return True
+
+    def leave(self, player, team=None):
+        """Takes `player` off court; returns False if they weren't on."""
+        team, bit = self._slot(player, team)
+        if not self.on[team] & bit:
+            return False
+        self.on[team] &= ~bit
+        return True
+
+    def mark_played(self, player):
+        team, bit = self._slot(player)
+        self.played[team] |= bit
+
+    def new_quarter(self):
+        for team in self.played:
+            self.played[team] = 0
+
+    def inactive(self):
+        """Players on court who haven't been in a play this quarter."""
+        return [player for team, mask in self.on.items()
+                for player in self.decode(team, mask & ~self.played[team])]
+
+    def snapshot(self):
+        """The on-court masks by team, to `decode` later."""
+        return dict(self.on)
@@ -1,4 +1,7 @@
+import hashlib
+import inspect
 import re
+import sys
 from collections import OrderedDict
 
 
@@ -127,3 +130,16 @@ def turnover(play):
 
 
 METHODS = [freethrow, twopoint, threepoint, rebound, block, foul, turnover]
+
+
+_rules_hash = None
+
+
+def rules_hash():
+    """Identifies the current classifier rules; changes whenever this module's
+    source does."""
+    global _rules_hash
+    if _rules_hash is None:
+        source = inspect.getsource(sys.modules[__name__])
+        _rules_hash = hashlib.sha1(source.encode('utf-8')).hexdigest()
+    return _rules_hash
@@ -2,28 +2,80 @@ import sys
 import re
 from collections import OrderedDict
 from copy import deepcopy
-from urllib2 import urlopen
+from functools import partial
+from itertools import chain
+from multiprocessing import Pool
 
 from bs4 import BeautifulSoup
+from sqlalchemy import select
 from tqdm import tqdm
 
-from db import player_box_score_table, team_box_score_table, game_table, db
-from pbp_methods import METHODS
-from performance_measure import (
-    PlayByPlayPerformanceMeasureCalculator,
-    PerformanceMeasureCaclulator,
+from aggregate import team_snapshots, team_snapshots_in_db
+from asyncwriter import AsyncWriter
+from db import (
+    box_score_tables, game_table, db, delete_game_rows, dimension_ids,
+    drop_season, game_registry, lineup_stints, parsed_games, player_box_score,
+    player_snapshots, player_snapshots_wide, season_of, snapshot_plays,
+    stint_players, team_box_score,
+)
+from db import players as player_dim, teams as team_dim
+from fetch import BACKFILL, FetchError, fetch
+from gameclock import clock_time, elapsed_seconds, period_start
+from events import (
+    load_parsed_game, reclassify, reset_connections, stale_games, stamp,
+    store_parsed_game, written_options,
 )
+from oncourt import OnCourt
+from pbp_methods import METHODS
+from prefix import PrefixSumIndex
+from stints import lineup_stints as derive_stints
+from workqueue import WorkQueue
+from performance_measure import PlayByPlayPerformanceMeasureCalculator
+
+
+# Snapshot granularities; a positive int means one snapshot every N seconds.
+SECOND = 'second'
+EVENT = 'event'
+PERIOD = 'period'
+
+# Where team snapshots are summed from the player rows.
+PYTHON = 'python'
+DATABASE = 'database'
+
+# How player snapshots are written: as `player_box_score` rows (WIDE), or as
+# integer keys and stats in `player_snapshots` (NORMALIZED).
+WIDE = 'wide'
+NORMALIZED = 'normalized'
+
+PLAYER_ORDER = ['gameid', 'season', 'quarter', 'time', 'elapsed_seconds',
+                'team', 'player', 'in_game', 'uPER', 'PIR', 'MIN', 'PTS',
+                'FGM', 'FGA', '3PM', '3PA', 'FTM', 'FTA', 'TREB', 'OREB',
+                'DREB', 'AST', 'STL', 'BLK', 'TO', 'PF', 'PFD', 'BLKD', 'home',
+                'home_score', 'away_score', 'winner', 'play']
+
+SNAPSHOT_ORDER = ['gameid', 'quarter', 'elapsed_seconds', 'in_game', 'uPER',
+                  'PIR', 'MIN', 'PTS', 'FGM', 'FGA', '3PM', '3PA', 'FTM',
+                  'FTA', 'TREB', 'OREB', 'DREB', 'AST', 'STL', 'BLK', 'TO',
+                  'PF', 'PFD', 'BLKD']
 
 
 class BadGameIDError(Exception):
     pass
 
 
-def make_soup(url):
-    res = urlopen(url)
+def parse_granularity(value):
+    if str(value).isdigit() and int(value) > 0:
+        return int(value)
+    if value in (SECOND, EVENT, PERIOD):
+        return value
+    raise ValueError("Unknown granularity: {}".format(value))
+
+
+def make_soup(url, priority=BACKFILL):
+    res = fetch(url, priority)
     if res.url == 'http://www.espn.com/nba/scoreboard':
         raise BadGameIDError("Not a valid gameid")
-    return BeautifulSoup(res, "lxml")
+    return BeautifulSoup(res.body, "lxml")
 
 
 def get_team(row):
@@ -105,34 +157,66 @@ class PlayByPlayToBoxScoreWriter(object):
     NOTE: Minutes are now calculated after the fact, so the minute
     recalculating during the initial read is uncesserary, just havn't
     removed it.
+
+    `granularity` controls how many snapshots are staged: one per second of
+    game clock (SECOND), one per play (EVENT), one every N seconds (an int)
+    or one per period (PERIOD).  Coarser snapshots hold the state at the end
+    of their bucket; the snapshots in between are never staged.
+
+    `team_aggregation` is PYTHON to sum team snapshots from the staged rows
+    and write only those, or DATABASE to write the player snapshots and have
+    the database sum the team snapshots from them.
+
+    `player_layout` is how those player snapshots are written: WIDE rows in
+    `player_box_score`, or NORMALIZED rows of keys and stats in
+    `player_snapshots`, read back through the `player_snapshots_wide` view.
     """
 
     def __init__(self, individual_table, team_table, game_table, gameid,
-                 debug=False):
+                 debug=False, from_store=False, granularity=SECOND,
+                 team_aggregation=PYTHON, player_layout=WIDE):
         print("Initializing")
         # General
         self.debug = debug
+        self.from_store = from_store
+        self.granularity = parse_granularity(granularity)
+        if team_aggregation not in (PYTHON, DATABASE):
+            raise ValueError(
+                "Unknown team aggregation: {}".format(team_aggregation))
+        self.team_aggregation = team_aggregation
+        if player_layout not in (WIDE, NORMALIZED):
+            raise ValueError(
+                "Unknown player layout: {}".format(player_layout))
+        self.player_layout = player_layout
         self.rows = []
+        # Snapshots a later one in the same bucket replaced; minutes are
+        # still counted over them.
+        self.superseded_rows = []
+        # (quarter, time, player) of rows `make_adjustment` changed.
+        self.adjusted = set()
         self.aggregate_rows = []
         self.individual_table = individual_table
         self.team_table = team_table
         self.game_table = game_table
         self.gameid = gameid
-        self.pbp, self.home, self.away, self.winner = get_play_by_play(gameid)
+        self.season = season_of(db.engine, gameid)
+        self.game_data = None
+        self.prefix_indexes = {}
+        parsed = self.load_game(gameid)
+        self.pbp = parsed['pbp']
+        self.home, self.away = parsed['home'], parsed['away']
+        self.winner = parsed['winner']
 
         # Sub and Time Tracking
         self.seconds_played_by_player = {}
-        print("Getting starters")
-        self.players_in_game = self.set_starters(gameid)
-        self.quarter_starters = {1: deepcopy(self.players_in_game)}
+        self.on_court = OnCourt(parsed['roster'], parsed['starters'])
+        self.quarter_starters = {1: self.on_court.snapshot()}
         self.players_ending_last_quarter = {}
-        self.in_a_play_this_quarter = []
         self.current_quarter = 1
         self.current_time = "12:00"
 
         # Scores
-        print("Getting Roster")
-        self.roster = get_roster(self.gameid, self.home, self.away)
+        self.roster = parsed['roster']
         print("Settings box score")
         self.running_box_score = self._default_running_box_score(self.roster)
 
@@ -148,14 +232,36 @@ class PlayByPlayToBoxScoreWriter(object):
         formatted = self.format_box_score(play, self.running_box_score)
         self.stage_player_level_data(play, formatted)
 
+    def load_game(self, gameid):
+        """The parsed play-by-play, roster and starters for a game; read from
+        the event store when reprocessing, otherwise scraped and stored."""
+        if self.from_store:
+            parsed = load_parsed_game(gameid)
+            if parsed is None:
+                raise BadGameIDError("Game {} was never stored".format(gameid))
+            return parsed
+        pbp, home, away, winner = get_play_by_play(gameid)
+        print("Getting starters")
+        starters = self.set_starters(gameid)
+        print("Getting Roster")
+        roster = get_roster(gameid, home, away)
+        store_parsed_game(gameid, pbp, home, away, winner, roster, starters)
+        return {"pbp": pbp, "home": home, "away": away, "winner": winner,
+                "roster": roster, "starters": starters}
+
     def _default_running_box_score(self, roster):
         for team in roster.keys():
             roster[team] = {name: {
-                'in_game': name in self.players_in_game
+                'in_game': name in self.on_court
             } for name in roster[team]}
         return roster
 
     def execute(self):
+        self.compute()
+        self.write()
+
+    def compute(self):
+        """Builds everything `write` needs, without touching the database."""
         for play in tqdm(self.pbp, desc="Analyzing Plays"):
             stats = self.handle_play(play)
             if stats is None:
@@ -172,9 +278,59 @@ class PlayByPlayToBoxScoreWriter(object):
         self.fill_in_to_end_of_game()
         self.rows = self.add_minutes_played(self.rows)
         #self.rows = self.add_perf_measures(self.rows)
-        self.write_game_data(self.gameid)
-        #self.write_player_data()
-        self.write_team_data()
+        if not self.from_store:
+            self.game_data = self.get_game_data(self.gameid)
+        if self.team_aggregation == PYTHON:
+            self.team_rows = team_snapshots(
+                self.rows, self.home, self.away, self.gameid)
+        else:
+            self.player_rows = self.unique_player_rows()
+        self.stints = derive_stints(
+            self.rows, self.home, self.away, self.gameid)
+
+    def write(self, replace=(), guard=None):
+        """Writes everything `compute` built in one transaction, so a write
+        that fails leaves none of the game's rows behind. The game's rows in
+        the `replace` tables are deleted first, in the same transaction.
+        `guard`, if given, is called with the connection before anything
+        else; raising from it writes nothing."""
+        with db.engine.begin() as conn:
+            if guard is not None:
+                guard(conn)
+            if replace:
+                delete_game_rows(conn, self.gameid, list(replace))
+            if self.game_data is not None:
+                self.write_game_data(conn)
+            conn.execute(parsed_games.update().where(
+                parsed_games.c.gameid == self.gameid).values(
+                granularity=str(self.granularity),
+                team_aggregation=self.team_aggregation,
+                player_layout=self.player_layout))
+            if self.team_aggregation == PYTHON:
+                self.write_team_data(conn)
+            elif self.player_layout == WIDE:
+                self.write_player_data(conn)
+                team_snapshots_in_db(
+                    conn, self.individual_table.table, self.team_table.table,
+                    self.gameid, self.home)
+            else:
+                self.write_normalized_player_data(conn)
+                team_snapshots_in_db(
+                    conn, player_snapshots_wide, self.team_table.table,
+                    self.gameid, self.home)
+            self.write_stint_data(conn)
+
+    def prefix_index(self, key='team'):
+        """A `PrefixSumIndex` of this game's snapshots by team or player,
+        built the first time it is asked for after `compute`."""
+        if key not in self.prefix_indexes:
+            if key == 'team':
+                rows = getattr(self, 'team_rows', None) or team_snapshots(
+                    self.rows, self.home, self.away, self.gameid)
+            else:
+                rows = self.unique_player_rows()
+            self.prefix_indexes[key] = PrefixSumIndex(rows, key)
+        return self.prefix_indexes[key]
 
     def handle_play(self, play):
         self.update_minutes_played(play['quarter'], play['time'])
@@ -196,7 +352,7 @@ class PlayByPlayToBoxScoreWriter(object):
 
     def update_player_stats(self, play_stats):
         for player, stats in play_stats.items():
-            self.in_a_play_this_quarter.append(player)
+            self.on_court.mark_played(player)
             self.update_running_box_score(self.get_team(player), player, stats)
 
     def get_team(self, player):
@@ -224,7 +380,9 @@ class PlayByPlayToBoxScoreWriter(object):
                 player_stats['team'] = team
                 player_stats['time'] = play['time']
                 player_stats['quarter'] = play['quarter']
-                in_game = player in self.players_in_game
+                player_stats['elapsed_seconds'] = elapsed_seconds(
+                    play['quarter'], play['time'])
+                in_game = player in self.on_court
                 player_stats['in_game'] = in_game
                 stats[team].append(player_stats)
         return stats
@@ -236,6 +394,8 @@ class PlayByPlayToBoxScoreWriter(object):
             # For plays that happend at the same second.
             play['play'] += ', {}'.format(self.rows[-1]['play'])
             self._remove_last_staged_row()
+        else:
+            self._supersede(play['quarter'], play['time'])
         for stats in box_score.values():
             for player_stat in stats:
                 player_stat['play'] = play['play']
@@ -243,6 +403,7 @@ class PlayByPlayToBoxScoreWriter(object):
                 player_stat['home_score'] = play['home_score']
                 player_stat['away_score'] = play['away_score']
                 player_stat['winner'] = self.winner
+                player_stat['season'] = self.season
                 self.rows.append(player_stat)
 
     def fill_in_to_end_of_game(self):
@@ -250,14 +411,16 @@ class PlayByPlayToBoxScoreWriter(object):
         previous_rows = self._rows_from_last_time()
         last_quarter = previous_rows[-1]['quarter']
         last_time = previous_rows[-1]['time']
-        skipped_times = self._times_between_times(
-            last_time, "0:00", last_quarter, 4)
+        skipped_times = self._snapshot_times(self._times_between_times(
+            last_time, "0:00", last_quarter, last_quarter))
         for quarter, time in skipped_times:
+            self._supersede(quarter, time)
             for row in previous_rows:
                 row = {k: v for k, v in row.items()}  # Safe duplicate
                 row['play'] = None
                 row['quarter'] = quarter
                 row['time'] = time
+                row['elapsed_seconds'] = elapsed_seconds(quarter, time)
                 self.rows.append(row)
 
     def fill_in_missing_times(self, quarter, time):
@@ -266,23 +429,65 @@ class PlayByPlayToBoxScoreWriter(object):
             return
         previous_rows = self._rows_from_last_time()
         last_row = self.rows[-1]
-        skipped_times = self._times_between_times(
-            last_row['time'], time, last_row['quarter'], quarter)
+        skipped_times = self._snapshot_times(self._times_between_times(
+            last_row['time'], time, last_row['quarter'], quarter),
+            following=(quarter, time))
         for quarter, time in skipped_times:
+            self._supersede(quarter, time)
             for row in previous_rows:
                 row = {k: v for k, v in row.items()}  # Safe duplicate
                 row['play'] = None
                 row['quarter'] = quarter
                 row['time'] = time
+                row['elapsed_seconds'] = elapsed_seconds(quarter, time)
                 self.rows.append(row)
 
+    def _bucket(self, quarter, time):
+        """Snapshots in the same bucket collapse into the last of them."""
+        if self.granularity in (SECOND, EVENT):
+            return quarter, time
+        elif self.granularity == PERIOD:
+            return quarter
+        elapsed = elapsed_seconds(quarter, time)
+        return quarter, -(-elapsed // self.granularity)
+
+    def _snapshot_times(self, times, following=None):
+        """The filled in times that are staged at this granularity: each one
+        that is the last of its bucket before the `following` play."""
+        if self.granularity == SECOND:
+            return times
+        elif self.granularity == EVENT:
+            return []
+        buckets = [self._bucket(*time) for time in times]
+        if following is not None:
+            buckets.append(self._bucket(*following))
+        return [time for i, time in enumerate(times)
+                if i + 1 == len(buckets) or buckets[i] != buckets[i + 1]]
+
+    def _supersede(self, quarter, time):
+        """Drops the last staged snapshot if the one about to be staged at
+        `quarter` and `time` falls in the same bucket."""
+        if not self.rows or self.granularity in (SECOND, EVENT):
+            return
+        last = self.rows[-1]
+        if self._bucket(last['quarter'], last['time']) != \
+                self._bucket(quarter, time):
+            return
+        superseded = []
+        while self.rows and self.rows[-1]['quarter'] == last['quarter'] and \
+                self.rows[-1]['time'] == last['time']:
+            superseded.append(self.rows.pop())
+        self.superseded_rows.extend(reversed(superseded))
+
     def _times_between_times(self, first, second, start_quarter, end_quarter):
         times = []
         if start_quarter != end_quarter:
             times += self._times_between_times(
                 first, "0:00", start_quarter, start_quarter)
+            # Overtimes start at 5:00, not 12:00.
             times += self._times_between_times(
-                "12:00", second, end_quarter, end_quarter)
+                clock_time(end_quarter, period_start(end_quarter)), second,
+                end_quarter, end_quarter)
             return times
         else:
             fmin, fsec = map(int, first.split(":"))
@@ -330,7 +535,7 @@ class PlayByPlayToBoxScoreWriter(object):
             else:
                 break
 
-    def write_game_data(self, gameid):
+    def get_game_data(self, gameid):
         soup = make_soup("http://www.espn.com/nba/game?gameId={}".format(gameid))
         date = soup.find('title').text.split('-')
         if date:
@@ -342,67 +547,70 @@ class PlayByPlayToBoxScoreWriter(object):
             "[^0-9]", "",
             soup.find('div', 'attendance').find('div', 'capacity').text
         )
+        attendance = int(attendance) if attendance else None
+        capacity = int(capacity) if capacity else None
         refs = soup.findAll("div", "game-info-note")
         if refs:
             refs = refs[-1].find('span').text
-        self.game_table.insert(dict(gameid=gameid, date=date, location=location,
-                                   attendance=attendance, capacity=capacity,
-                                   refs=refs))
-
-    def write_team_data(self):
-        """Stage the aggregate team box score for writing to the database."""
-        perf_measure = PerformanceMeasureCaclulator(None)
-        order = ['gameid', 'quarter', 'time', 'team', 'PIR', 'PTS', 'FGM',
-                 'FGA', '3PM', '3PA', 'FTM', 'FTA', 'TREB', 'OREB', 'DREB',
-                 'AST', 'STL', 'BLK', 'TO', 'PF', 'PFD', 'winning_team',
-                 'winner']
-        uneeded_fields = ['away_score', 'home_score', 'MIN', 'time', 'home',
-                          'quarter', 'winner', 'MIN', 'team', 'player', 'play',
-                          'gameid', 'in_game']
-        last_quarter = None
-        last_time = None
-        aggregates = {self.home: {}, self.away: {}}
-        for row in tqdm(self.rows, desc="Writing team data"):
-            quarter = row['quarter']
-            time = row['time']
-            team = row['team']
-            if last_quarter is None:
-                last_quarter = quarter
-                last_time = time
-            elif quarter != last_quarter or time != last_time:
-                last_quarter = quarter
-                last_time = time
-                for stats in aggregates.values():
-                    stats['PIR'] = perf_measure.calculate_pir(stats)
-                    self.team_table.insert(self.order_row(stats, order))
-                aggregates = {self.home: {}, self.away: {}}
-            for field, value in row.items():
-                if field in uneeded_fields:
-                    continue
-                aggregates[team].setdefault(field, 0)
-                try:
-                    aggregates[team][field] += value
-                except TypeError:
-                    del aggregates[team][field]
-                if row['winner'] == self.home:
-                    aggregates[team]['winner'] = 'home'
-                else:
-                    aggregates[team]['winner'] = 'away'
-                aggregates[team]['winning_team'] = row['winner']
-                aggregates[team]['team'] = row['team']
-                aggregates[team]['time'] = row['time']
-                aggregates[team]['quarter'] = row['quarter']
-                aggregates[team]['gameid'] = self.gameid
-
-
-    def write_player_data(self):
-        order = ['gameid', 'quarter', 'time', 'team', 'player', 'in_game',
-                 'uPER', 'PIR', 'MIN', 'PTS', 'FGM', 'FGA', '3PM', '3PA', 'FTM',
-                 'FTA', 'TREB', 'OREB', 'DREB', 'AST', 'STL', 'BLK', 'TO', 'PF',
-                 'PFD', 'home', 'home_score', 'away_score', 'winner', 'play']
-        for row in tqdm(self.rows, desc="Writing Player Data"):
-            row['gameid'] = self.gameid
-            self.individual_table.insert(self.order_row(row, order))
+        return dict(gameid=gameid, date=date, location=location,
+                    attendance=attendance, capacity=capacity, refs=refs)
+
+    def write_game_data(self, conn):
+        conn.execute(self.game_table.table.insert(), self.game_data)
+
+    def write_team_data(self, conn):
+        """Write the team box scores aggregated from the staged rows."""
+        if self.team_rows:
+            conn.execute(self.team_table.table.insert(), self.team_rows)
+
+    def write_stint_data(self, conn):
+        """Write the lineup stints the staged rows' `in_game` flags describe."""
+        stints, players = self.stints
+        if stints:
+            conn.execute(lineup_stints.insert(), stints)
+        if players:
+            conn.execute(stint_players.insert(), players)
+
+    def unique_player_rows(self):
+        """The staged rows in `PLAYER_ORDER`, keeping the last row staged
+        for a player at any one snapshot."""
+        rows = OrderedDict()
+        for row in self.rows:
+            row = self.order_row(row, PLAYER_ORDER)
+            rows[(row['quarter'], row['elapsed_seconds'], row['player'])] = row
+        return list(rows.values())
+
+    def write_player_data(self, conn):
+        if self.player_rows:
+            conn.execute(self.individual_table.table.insert(), self.player_rows)
+
+    def write_normalized_player_data(self, conn):
+        """Write the player snapshots as keys and stats, with the clock,
+        score and play of each snapshot written once to `snapshot_plays`."""
+        player_ids = dimension_ids(
+            conn, player_dim, set(row['player'] for row in self.player_rows))
+        team_ids = dimension_ids(
+            conn, team_dim, set(row['team'] for row in self.player_rows))
+        plays = OrderedDict()
+        snapshots = []
+        for row in self.player_rows:
+            plays[(row['quarter'], row['elapsed_seconds'])] = {
+                "gameid": self.gameid,
+                "quarter": row['quarter'],
+                "elapsed_seconds": row['elapsed_seconds'],
+                "time": row['time'],
+                "home_score": row['home_score'],
+                "away_score": row['away_score'],
+                "play": row['play'],
+            }
+            snapshot = self.order_row(row, SNAPSHOT_ORDER)
+            snapshot['player_id'] = player_ids[row['player']]
+            snapshot['team_id'] = team_ids[row['team']]
+            snapshots.append(snapshot)
+        if plays:
+            conn.execute(snapshot_plays.insert(), list(plays.values()))
+        if snapshots:
+            conn.execute(player_snapshots.insert(), snapshots)
 
     def order_row(self, row, order):
         row['gameid'] = self.gameid
@@ -412,7 +620,38 @@ class PlayByPlayToBoxScoreWriter(object):
         return data
 
     def add_minutes_played(self, rows):
-        first_play_time = rows[0]['time']
+        """Sets each row's MIN to the minutes its player had played by then.
+
+        Minutes are counted over every snapshot staged at SECOND granularity,
+        so a snapshot has the same MIN at every granularity: over the rows a
+        coarser granularity superseded, and over the times it never filled
+        in, as the copies of the snapshot before them they would have been.
+        """
+        staged = rows
+        if self.superseded_rows:
+            staged = sorted(rows + self.superseded_rows, key=lambda row: (
+                row['quarter'], row['elapsed_seconds']))
+        snapshots, order = {}, []
+        for row in staged:
+            time = (row['quarter'], row['time'])
+            if time not in snapshots:
+                snapshots[time] = {}
+                order.append(time)
+            snapshots[time].setdefault(row['player'], []).append(row)
+        # (quarter, time) of every snapshot at SECOND granularity, with the
+        # staged snapshots before and after it.
+        timeline = []
+        last = None
+        for snapshot in order:
+            if last is not None:
+                timeline.extend((time, last, snapshot) for time in
+                                self._times_between_times(
+                                    last[1], snapshot[1], last[0], snapshot[0])
+                                if time not in snapshots)
+            timeline.append((snapshot, snapshot, snapshot))
+            last = snapshot
+
+        first_snapshot = timeline[0][0]
         players = reduce(lambda x, y: x.keys() + y.keys(), self.roster.values())
         # Not efficient, but easier to think about.
         for player in tqdm(players, desc="Calculating MIN"):
@@ -420,31 +659,40 @@ class PlayByPlayToBoxScoreWriter(object):
             last_time = "12:00"
             last_quarter = 1
             in_game = False
-            for row in rows:
-                if row['player'] != player:
-                    continue
-                elif not row['in_game']:
-                    last_time = row['time']
-                    last_quarter = row['quarter']
-                    row['MIN'] = self.seconds_to_minutes(players_seconds)
-                    in_game = False
-                    continue
-                elif not in_game and row['time'] != first_play_time:
-                    last_time = row['time']
-                    last_quarter = row['quarter']
-                    row['MIN'] = self.seconds_to_minutes(players_seconds)
-                    in_game = True
-                    continue
+            for (quarter, time), before, after in timeline:
+                if (quarter, time) == before:
+                    player_rows = snapshots[before].get(player, ())
                 else:
-                    quarter = row['quarter']
-                    time = row['time']
-                    players_seconds += self.calc_seconds(
-                        quarter, time, last_quarter, last_time)
-                    row['MIN'] = self.seconds_to_minutes(players_seconds)
-                    last_time = row['time']
-                    last_quarter = row['quarter']
+                    player_rows = self._filled_in_rows(
+                        snapshots, player, (quarter, time), before, after,
+                        staged[0])
+                for row in player_rows:
+                    if not row['in_game']:
+                        in_game = False
+                    elif not in_game and (quarter, time) != first_snapshot:
+                        in_game = True
+                    else:
+                        players_seconds += self.calc_seconds(
+                            quarter, time, last_quarter, last_time)
+                    last_time = time
+                    last_quarter = quarter
+                    if (quarter, time) == before:
+                        row['MIN'] = self.seconds_to_minutes(players_seconds)
         return rows
 
+    def _filled_in_rows(self, snapshots, player, time, before, after, first):
+        """The rows of `player` that filling in `time`, between the staged
+        snapshots `before` and `after`, would have staged."""
+        # `_rows_from_last_time` never copies the first row staged.
+        if before == (first['quarter'], first['time']) and \
+                player == first['player']:
+            return ()
+        # Adjustments to a quarter made once the snapshot after a filled in
+        # time was staged change the filled in rows too.
+        if time[0] != before[0] and after + (player,) in self.adjusted:
+            return snapshots[after].get(player, ())
+        return snapshots[before].get(player, ())
+
     def calc_seconds(self, quarter, time, last_quarter, last_time):
         if last_quarter != quarter:
             last_time = "12:00" if quarter <= 4 else "5:00"
@@ -493,7 +741,7 @@ class PlayByPlayToBoxScoreWriter(object):
 
     def update_minutes_played(self, quarter, time):
         seconds_elapsed = self._seconds_elapsed(quarter, time)
-        for player in self.players_in_game:
+        for player in self.on_court:
             self.seconds_played_by_player.setdefault(player, 0)
             self.seconds_played_by_player[player] += seconds_elapsed
 
@@ -530,9 +778,9 @@ class PlayByPlayToBoxScoreWriter(object):
     def end_of_quarter(self, play):
         if re.findall('End of', play['play']):
             self.check_for_inactive_players(play['quarter'])
-            players = deepcopy(self.players_in_game)
-            self.players_ending_last_quarter[play['quarter']] = players
-            self.in_a_play_this_quarter = []
+            self.players_ending_last_quarter[play['quarter']] = \
+                self.on_court.snapshot()
+            self.on_court.new_quarter()
             return True
 
     def check_for_inactive_players(self, quarter):
@@ -542,17 +790,16 @@ class PlayByPlayToBoxScoreWriter(object):
         players."""
         if quarter == 1:
             return
-        for player in self.players_in_game:
-            if player not in self.in_a_play_this_quarter:
-                self.players_in_game.remove(player)
-                self.make_adjustment(self.create_adjustment(player, 0))
+        for player in self.on_court.inactive():
+            self.on_court.leave(player)
+            self.make_adjustment(self.create_adjustment(player, 0))
 
 
     def make_sub(self, play):
         if re.findall('enters the game for', play['play']):
             player1, player2 = play['play'].split(" enters the game for ")
-            self.in_a_play_this_quarter.append(player1)
-            self.in_a_play_this_quarter.append(player2)
+            self.on_court.mark_played(player1)
+            self.on_court.mark_played(player2)
             self.sub_in(play['team'], player1)
             self.sub_out(play['team'], player2)
             return True
@@ -560,34 +807,33 @@ class PlayByPlayToBoxScoreWriter(object):
 
     def sub_in(self, team, player):
         self.seconds_played_by_player.setdefault(player, 0)
-        if player not in self.players_in_game:
-            self.players_in_game.append(player)
-        else:
+        if not self.on_court.enter(player, team):
             self.make_adjustment(self.create_adjustment(player, -1))
         self.running_box_score[team][player]['in_game'] = True
 
     def sub_out(self, team, player):
-        if player in self.players_in_game:
-            self.players_in_game.remove(player)
-        else:
+        if not self.on_court.leave(player, team):
             self.make_adjustment(self.create_adjustment(player, 1))
         self.running_box_score[team][player]['in_game'] = False
 
     def assure_players_in_game(self, players):
         for player in players:
-            if player not in self.players_in_game:
-                self.players_in_game.append(player)
+            if self.on_court.enter(player):
                 self.make_adjustment(self.create_adjustment(player, 1))
 
     def make_adjustment(self, adjustment):
-        for row in self.rows:
+        for row in chain(self.rows, self.superseded_rows):
             if row['player'] == adjustment['player'] and \
                     row['quarter'] == adjustment['quarter']:
                 row.setdefault('MIN', 0)
                 row['MIN'] += adjustment['MIN']
                 row['in_game'] = adjustment['in_game']
-        seconds = adjustment['MIN'] * 60
-        self.seconds_played_by_player[adjustment['player']] += seconds
+                self.adjusted.add((row['quarter'], row['time'], row['player']))
+        # A player subbed out before any play of theirs has no time yet.
+        player = adjustment['player']
+        self.seconds_played_by_player[player] = \
+            self.seconds_played_by_player.get(player, 0) + \
+            adjustment['MIN'] * 60
 
     def create_adjustment(self, player, modifier):
         """When a player is subbed in at the start of a quarter,
@@ -631,50 +877,164 @@ def skippable_gameids():
 
 
 def regular_season_gameids():
+    """Game ids from the registry built by valid_gameids.py, falling back to
+    the bundled 2007-2016 list when nothing has been crawled."""
+    gameids = [row['gameid'] for row in db.query(
+        'SELECT gameid FROM game_registry ORDER BY gameid')]
+    if gameids:
+        return gameids
     with open('regular_season_gameids_2007_2016.txt', 'r') as f:
         return map(int, sorted(f.read().split(',')))
 
 
 def last_written_gameid():
     return int(
-        db.query('SELECT MAX(gameid) id FROM team_box_score').next()['id'])
+        db.query('SELECT MAX(gameid) id FROM team_box_score_all').next()['id'])
+
 
+def write_failed(gameid, e):
+    print("Could not write game: {}!".format(gameid))
+    print(e)
+    write_errored(gameid, "error_gameids.txt")
 
-def write_many(amount):
+
+def write_many(amount, debug=False, granularity=SECOND,
+               team_aggregation=PYTHON, player_layout=WIDE):
     #skip = skippable_gameids()
     last_gameid = 0 #last_written_gameid()
     print("last written gameid: {}".format(last_gameid))
     first_id = None
-    for gameid in regular_season_gameids()[10000:]:
-        if not first_id:
-            first_id = gameid
-        print(first_id)
-        if gameid <= last_gameid:  # or gameid in skip:
-            continue
-        try:
-            PlayByPlayToBoxScoreWriter(
-                player_box_score_table, team_box_score_table, game_table,
-                gameid, debug=len(sys.argv) > 2).execute()
-        except BadGameIDError:
-            print("BAD GAME ID")
-            write_errored(gameid, "skipped_gameids.txt")
-        except KeyError as e:
-            print("A key error occured in game: {}!".format(gameid))
-            print(e.message)
-            write_errored(gameid, "error_gameids.txt")
-        except IndexError as e:
-            print("A index error occured in game: {}!".format(gameid))
-            print(e.message)
-            write_errored(gameid, "error_gameids.txt")
-        except AttributeError as e:
-            print("An attribute error occured in game: {}!".format(gameid))
-            print(e.message)
-            write_errored(gameid, "error_gameids.txt")
-        except Exception as e:
-            print("Unknown error occured in game: {}!".format(gameid))
-            print(e.message)
-            print(e)
-            write_errored(gameid, "error_gameids.txt")
+    with AsyncWriter(on_error=write_failed) as writer:
+        for gameid in regular_season_gameids():
+            if not first_id:
+                first_id = gameid
+            print(first_id)
+            if gameid <= last_gameid:  # or gameid in skip:
+                continue
+            try:
+                game = PlayByPlayToBoxScoreWriter(
+                    *box_score_tables(gameid), game_table=game_table,
+                    gameid=gameid, debug=debug, granularity=granularity,
+                    team_aggregation=team_aggregation,
+                    player_layout=player_layout)
+                game.compute()
+            except BadGameIDError:
+                print("BAD GAME ID")
+                write_errored(gameid, "skipped_gameids.txt")
+            except FetchError as e:
+                print("Could not fetch game: {}!".format(gameid))
+                print(e.message)
+                write_errored(gameid, "error_gameids.txt")
+            except KeyError as e:
+                print("A key error occured in game: {}!".format(gameid))
+                print(e.message)
+                write_errored(gameid, "error_gameids.txt")
+            except IndexError as e:
+                print("A index error occured in game: {}!".format(gameid))
+                print(e.message)
+                write_errored(gameid, "error_gameids.txt")
+            except AttributeError as e:
+                print("An attribute error occured in game: {}!".format(gameid))
+                print(e.message)
+                write_errored(gameid, "error_gameids.txt")
+            except Exception as e:
+                print("Unknown error occured in game: {}!".format(gameid))
+                print(e.message)
+                print(e)
+                write_errored(gameid, "error_gameids.txt")
+            else:
+                writer.submit(gameid, game.write)
+
+
+def enqueue_gameids():
+    WorkQueue(db.engine).enqueue(regular_season_gameids())
+
+
+def work_from_queue(granularity=SECOND, team_aggregation=PYTHON,
+                    player_layout=WIDE):
+    """Processes games claimed from the shared work queue until it is
+    empty.  Any number of these can run at once, on any number of hosts.
+    A game is only marked complete once its rows are written."""
+    def write(game):
+        game.write(guard=partial(queue.complete, game.gameid))
+
+    with WorkQueue(db.engine) as queue, \
+            AsyncWriter(on_error=queue.fail) as writer:
+        while True:
+            gameid = queue.claim()
+            if gameid is None:
+                print("Work queue is empty")
+                return
+            # A previous claim on this game may have died mid-write.
+            delete_game_rows(db.engine, gameid)
+            try:
+                game = PlayByPlayToBoxScoreWriter(
+                    *box_score_tables(gameid), game_table=game_table,
+                    gameid=gameid, granularity=granularity,
+                    team_aggregation=team_aggregation,
+                    player_layout=player_layout)
+                game.compute()
+            except BadGameIDError as e:
+                print("BAD GAME ID")
+                queue.fail(gameid, e, retry=False)
+            except Exception as e:
+                print("Error occured in game: {}!".format(gameid))
+                print(e)
+                queue.fail(gameid, e)
+            else:
+                writer.submit(gameid, partial(write, game))
+
+
+def reprocess(processes=None):
+    """Reclassifies every stored game parsed under older `pbp_methods` rules
+    and rebuilds the snapshots of only the games whose stats changed."""
+    stale = dict(stale_games())
+    print("Reclassifying {} games".format(len(stale)))
+    pool = Pool(processes, initializer=reset_connections)
+    changed = []
+    try:
+        for gameid, digest in tqdm(pool.imap_unordered(
+                reclassify, stale, chunksize=16), total=len(stale),
+                desc="Reclassifying"):
+            if digest == stale[gameid]:
+                stamp(gameid, digest)
+            else:
+                changed.append((gameid, digest))
+    finally:
+        pool.close()
+        pool.join()
+    print("Rebuilding {} games".format(len(changed)))
+
+    def write(game, digest):
+        game.write(replace=[team_box_score, player_box_score, lineup_stints,
+                            stint_players, snapshot_plays, player_snapshots])
+        stamp(game.gameid, digest)
+
+    with AsyncWriter() as writer:
+        for gameid, digest in sorted(changed):
+            game = PlayByPlayToBoxScoreWriter(
+                *box_score_tables(gameid), game_table=game_table,
+                gameid=gameid, from_store=True, **written_options(gameid))
+            game.compute()
+            writer.submit(gameid, partial(write, game, digest))
+
+
+def rebuild_season(season):
+    """Drops a season's box scores and writes its stored games again."""
+    query = select([game_registry.c.gameid]).select_from(game_registry.join(
+        parsed_games, parsed_games.c.gameid == game_registry.c.gameid)).where(
+        game_registry.c.season == season).order_by(game_registry.c.gameid)
+    gameids = [row[0] for row in db.engine.execute(query)]
+    drop_season(db.engine, season)
+    print("Rebuilding {} stored games of {}".format(len(gameids), season))
+    with AsyncWriter() as writer:
+        for gameid in tqdm(gameids, desc="Rebuilding"):
+            game = PlayByPlayToBoxScoreWriter(
+                *box_score_tables(gameid), game_table=game_table,
+                gameid=gameid, from_store=True, **written_options(gameid))
+            game.compute()
+            writer.submit(gameid, partial(
+                game.write, replace=[lineup_stints, stint_players]))
 
 
 if __name__ == '__main__':
@@ -693,4 +1053,14 @@ if __name__ == '__main__':
     4. Also not duplicate times when multiple plays happen show up in
     team box score data"
     """
-    write_many(sys.argv[1] if len(sys.argv) > 1 else None)
+    if len(sys.argv) > 1 and sys.argv[1] == 'enqueue':
+        enqueue_gameids()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'worker':
+        work_from_queue()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'reprocess':
+        reprocess()
+    elif len(sys.argv) > 2 and sys.argv[1] == 'rebuild':
+        rebuild_season(int(sys.argv[2]))
+    else:
+        write_many(sys.argv[1] if len(sys.argv) > 1 else None,
+                   debug=len(sys.argv) > 2)
@@ -0,0 +1,120 @@
+"""Rolling-window box scores from the running totals snapshots hold.
+
+Every snapshot is a running box score, so a game's snapshots already are
+prefix sums: the totals over the window (start, end] are the snapshot at
+`end` minus the snapshot at `start`. `PrefixSumIndex` lays a game's
+snapshots out as one forward-filled row per second of elapsed game clock for
+every team (or player), so any window is two lookups and a subtraction
+however long it is, and `rolling` gives a window ending at every snapshot of
+the game in one vectorized step.
+
+    index = PrefixSumIndex(team_rows)
+    index.window('cle', 1800, 120)['PTS']   # Cleveland's points, 28:00-30:00
+    index.rolling(300)                      # last 5 minutes at every snapshot
+"""
+import numpy as np
+
+from db import STAT_COLUMNS
+
+
+COLUMNS = ['PIR'] + STAT_COLUMNS
+
+
+def window_totals(cumulative, seconds, at=None):
+    """Totals over the `seconds` before each second in `at` (every second by
+    default) of running totals laid out one second per row of the first
+    axis. Windows reaching back before tip-off start at zero, and windows
+    ending before it are all zeros."""
+    cumulative = np.asarray(cumulative)
+    if at is None:
+        at = np.arange(len(cumulative))
+    at = np.asarray(at)
+    return _totals_at(cumulative, at) - _totals_at(cumulative, at - seconds)
+
+
+def _totals_at(cumulative, at):
+    """Running totals at each second in `at`: zero before tip-off, and the
+    final totals after the buzzer, when they stop changing. With no totals
+    at all (a game with no snapshots) every second is zero."""
+    if not len(cumulative):
+        return np.zeros(at.shape + cumulative.shape[1:])
+    totals = np.take(cumulative, np.clip(at, 0, len(cumulative) - 1), axis=0)
+    totals[at < 0] = 0
+    return totals
+
+
+class PrefixSumIndex(object):
+    """Running totals of one game by `key` ('team' or 'player').
+
+    :param rows: snapshot rows as the writer stages or writes them, with
+        `quarter`, `elapsed_seconds`, `key` and the stat `columns`. Rows
+        of the same snapshot and key are summed, so player rows can be
+        indexed by team; when two snapshots fall on the same second (the
+        end of a period and the start of the next) the later one is kept.
+    """
+
+    def __init__(self, rows, key='team', columns=COLUMNS):
+        self.key = key
+        self.columns = list(columns)
+        self.keys = sorted(set(row[key] for row in rows))
+        positions = dict((name, i) for i, name in enumerate(self.keys))
+
+        snapshots = sorted(set((row['quarter'], row['elapsed_seconds'])
+                               for row in rows))
+        ids = dict((snapshot, i) for i, snapshot in enumerate(snapshots))
+        self.elapsed = np.array([elapsed for _, elapsed in snapshots],
+                                dtype=np.int64)
+        shape = (len(snapshots), len(self.keys))
+        totals = np.zeros(shape + (len(self.columns),))
+        present = np.zeros(shape, dtype=bool)
+        if rows:
+            bins = (np.array([ids[(row['quarter'], row['elapsed_seconds'])]
+                              for row in rows]),
+                    np.array([positions[row[key]] for row in rows]))
+            np.add.at(totals, bins, [[row.get(column) or 0
+                                      for column in self.columns]
+                                     for row in rows])
+            present[bins] = True
+
+        # The last snapshot of each second, by time then key.
+        last = np.ones(len(snapshots), dtype=bool)
+        last[:-1] = self.elapsed[1:] != self.elapsed[:-1]
+        self.elapsed = self.elapsed[last]
+        totals, present = totals[last], present[last]
+
+        seconds = int(self.elapsed[-1]) + 1 if len(self.elapsed) else 0
+        self.sums = np.zeros((seconds, len(self.keys), len(self.columns)))
+        filled = np.zeros((seconds, len(self.keys)), dtype=bool)
+        snapshot, side = np.nonzero(present)
+        self.sums[self.elapsed[snapshot], side] = totals[snapshot, side]
+        filled[self.elapsed[snapshot], side] = True
+        # Forward fill every key from its own last snapshot.
+        source = np.where(filled, np.arange(seconds)[:, None], 0)
+        np.maximum.accumulate(source, axis=0, out=source)
+        self.sums = self.sums[source, np.arange(len(self.keys))]
+
+    def __len__(self):
+        """Seconds of game clock indexed."""
+        return len(self.sums)
+
+    def _position(self, name):
+        try:
+            return self.keys.index(name)
+        except ValueError:
+            raise KeyError(name)
+
+    def total(self, name, start, end):
+        """{column: total} of `name` over the seconds (start, end]."""
+        return dict(zip(self.columns, window_totals(
+            self.sums[:, self._position(name)], end - start, [end])[0]))
+
+    def window(self, name, end, seconds):
+        """{column: total} of `name` over the `seconds` up to `end`."""
+        return self.total(name, end - seconds, end)
+
+    def rolling(self, seconds, at=None):
+        """Totals over the `seconds` up to each second in `at` (every
+        snapshot by default) for every key at once, as an array of shape
+        (len(at), len(keys), len(columns))."""
+        return window_totals(
+            self.sums, seconds, self.elapsed if at is None else at)
@@ -1,13 +1,19 @@
 """DATA is from NBAstatingfive.com"""
+import os
 import re
+import time
 from urllib import urlencode
 
-
-import requests
 from bs4 import BeautifulSoup
 
 from db import per_table
-from per import PERCaclulator
+from fetch import LIVE, FetchError, fetch
+from livepush import PushServer, game_snapshot
+from performance_measure import PerformanceMeasureCaclulator
+
+
+FEED_URL = os.getenv("NBA_LIVE_FEED_URL",
+                     "http://www.nbastartingfive.com/ajaxLiveStats.jsp")
 
 
 def write_data(stats):
@@ -43,13 +49,14 @@ def extract_player_stats(pos):
 
 
 def get_html(pos):
-    url = "http://www.nbastartingfive.com/ajaxLiveStats.jsp?"
+    url = FEED_URL + "?"
     url += urlencode({"id": 3, "pos": pos})  # id 3 == NBA.
-    result = requests.get(url)
-    if not result.ok:
-        print("Error making request: {}".format(result.status_code))
+    try:
+        result = fetch(url, LIVE)
+    except FetchError as e:
+        print("Error making request: {}".format(e))
         raise RuntimeError("Cannot reach nbastartingfive.com.")
-    return result.content
+    return result.body
 
 
 def get_player_stats(mappings, row):
@@ -84,14 +91,43 @@ def extract_names(col):
 
 
 def add_per(grouped_stats):
-    calc = PERCaclulator(grouped_stats)
+    calc = PerformanceMeasureCaclulator(grouped_stats)
     calc.update_stats()
     return calc.stats
 
 
 def get_gametime():
-    """Currently not implemented.  Will implement later."""
-    return "Q1 - 12:00"
+    """The feed doesn't carry the game clock yet, so the time of the stats is
+    unknown (None) rather than guessed."""
+    return None
+
+
+def parse_gametime(gametime):
+    """(quarter, clock) of a "Q1 - 12:00" game time, or (None, None)."""
+    if not gametime:
+        return None, None
+    quarter, clock = gametime.split(' - ')
+    return int(quarter[1:]), clock
+
+
+def watch(home, away, interval=5, port=8765):
+    """Records the live stats every `interval` seconds, pushing each changed
+    snapshot of the game to subscribers of a push server on `port`.
+    Snapshots only carry a win probability once `get_gametime` knows the
+    clock."""
+    server = PushServer(port=port).start()
+    game = "{}@{}".format(away, home)
+    print("Pushing {} on port {}".format(game, server.server_address[1]))
+    try:
+        while True:
+            stats = get_scores()
+            write_data(stats)
+            quarter, clock = parse_gametime(get_gametime())
+            server.state.publish(
+                game, game_snapshot(home, away, stats, quarter, clock))
+            time.sleep(interval)
+    finally:
+        server.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,234 @@
+"""Replays stored games as a live feed for load-testing the realtime path.
+
+Games stored by the scraper (see events.py) are served from a local HTTP
+server in the same `ajaxLiveStats.jsp` table format nbastartingfive.com
+uses, with the clock running `speed` times faster than real time. Every game
+tips off when the server starts, so many games can be live at once.
+
+`run` also drives the realtime pipeline against the replay: it polls the
+feed, writes to `PER_data`, pushes to a `livepush` server, and reports the
+lag between an event appearing in the feed and it being written and pushed.
+"""
+import bisect
+import sys
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from urlparse import parse_qs, urlparse
+
+from events import classify, load_parsed_game
+from fetch import FetchScheduler, get_scheduler, set_scheduler
+from gameclock import clock_time, elapsed_seconds, period_start
+
+
+POSITIONS = ["PG", "SG", "SF", "PF", "C"]
+
+# Header of the feed table; "M" columns are rendered as "made-attempted".
+FEED_COLUMNS = ['PTS', 'FGM', '3PM', 'FTM', 'OREB', 'DREB', 'TREB', 'AST',
+                'STL', 'BLK', 'TO', 'PF']
+ATTEMPTS = {'FGM': 'FGA', '3PM': '3PA', 'FTM': 'FTA'}
+
+
+class ReplayGame(object):
+    """Box score of one stored game after each of its plays."""
+
+    def __init__(self, gameid):
+        parsed = load_parsed_game(gameid)
+        if parsed is None:
+            raise ValueError("Game {} has not been stored".format(gameid))
+        self.gameid = gameid
+        self.home, self.away = parsed['home'], parsed['away']
+        self.positions = {}
+        teams = {}
+        for team, players in parsed['roster'].items():
+            for i, player in enumerate(players):
+                teams[player] = team
+                self.positions[player] = POSITIONS[i % len(POSITIONS)]
+        self.teams = teams
+
+        box_score = dict((player, {}) for player in teams)
+        self.times, self.box_scores = [0], [self._copy(box_score)]
+        for play in parsed['pbp']:
+            stats = classify(play['play']) or {}
+            for player, player_stats in stats.items():
+                if player not in box_score:
+                    continue
+                for stat, amount in player_stats.items():
+                    box_score[player][stat] = \
+                        box_score[player].get(stat, 0) + amount
+            self.times.append(elapsed_seconds(play['quarter'], play['time']))
+            self.box_scores.append(self._copy(box_score))
+        self.length = self.times[-1]
+
+    def _copy(self, box_score):
+        return dict((player, dict(stats)) for player, stats
+                    in box_score.items())
+
+    def clock(self, elapsed):
+        """(quarter, "M:SS") of the game `elapsed` seconds after tip-off."""
+        elapsed = min(int(elapsed), self.length)
+        quarter = 1
+        while elapsed > period_start(quarter + 1):
+            quarter += 1
+        return quarter, clock_time(quarter, elapsed)
+
+    def at(self, elapsed):
+        """(elapsed seconds of the newest play, box score) as of `elapsed`."""
+        i = bisect.bisect_right(self.times, elapsed) - 1
+        return self.times[i], self.box_scores[i]
+
+
+class ReplayFeed(object):
+    def __init__(self, games, speed=1.0):
+        self.games = games
+        self.speed = float(speed)
+        self.started = time.time()
+
+    def clock(self, now=None):
+        return ((now or time.time()) - self.started) * self.speed
+
+    def finished(self):
+        return self.clock() > max(game.length for game in self.games)
+
+    def emitted_at(self, elapsed):
+        """Wall time at which the play at `elapsed` appeared in the feed."""
+        return self.started + elapsed / self.speed
+
+    def newest_emission(self, now=None):
+        clock = self.clock(now)
+        return self.emitted_at(max(game.at(clock)[0] for game in self.games))
+
+    def render(self, pos):
+        clock = self.clock()
+        header = "".join("<td><span>{}</span></td>".format(column)
+                         for column in ['PLAYER'] + FEED_COLUMNS)
+        rows = ["<tr><td>Live Stats</td></tr>", "<tr>{}</tr>".format(header)]
+        for game in self.games:
+            _, box_score = game.at(clock)
+            for player, stats in sorted(box_score.items()):
+                if game.positions[player] != pos:
+                    continue
+                cells = ['<td><img src="/logos/{}.png"/>{}</td>'.format(
+                    game.teams[player], player)]
+                for column in FEED_COLUMNS:
+                    value = str(stats.get(column, 0))
+                    if column in ATTEMPTS:
+                        value += "-{}".format(stats.get(ATTEMPTS[column], 0))
+                    cells.append("<td>{}</td>".format(value))
+                rows.append("<tr>{}</tr>".format("".join(cells)))
+        return "<table>{}</table>".format("".join(rows))
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        body = self.server.feed.render(query.get('pos', ['PG'])[0])
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ReplayServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, feed, port=0):
+        HTTPServer.__init__(self, ('127.0.0.1', port), ReplayHandler)
+        self.feed = feed
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}/ajaxLiveStats.jsp".format(
+            self.server_address[1])
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+
+def run(gameids, speed=100.0, interval=1.0, write=True, push_port=0):
+    """Replays `gameids` and runs the realtime pipeline against them until
+    every game has ended, then prints lag and throughput. Returns the number
+    of polls, failed polls, rows written and snapshots pushed."""
+    import realtime
+    from livepush import PushServer, game_snapshot
+
+    games = [ReplayGame(gameid) for gameid in gameids]
+    feed = ReplayFeed(games, speed)
+    server = ReplayServer(feed).start()
+    push = PushServer(port=push_port).start()
+    feed_url, scheduler = realtime.FEED_URL, get_scheduler()
+    realtime.FEED_URL = server.url
+    # The replay is local, so the pacing meant for ESPN would only get in
+    # the way of measuring the pipeline.
+    set_scheduler(FetchScheduler(rate=1000, burst=100, max_rate=10000,
+                                 initial_concurrency=16))
+
+    lags, polls, errors = [], [], 0
+    rows = pushed = 0
+    start = time.time()
+    try:
+        while not feed.finished():
+            polled = time.time()
+            emitted = feed.newest_emission(polled)
+            try:
+                stats = realtime.get_scores()
+            except ZeroDivisionError as e:
+                # The PER calculator divides by the made shots so far, so
+                # polls before the first basket fail; count them and go on.
+                errors += 1
+                print("Poll failed: {!r}".format(e))
+            else:
+                if write:
+                    realtime.write_data(stats)
+                    rows += sum(len(players) for players in stats.values())
+                for game in games:
+                    quarter, clock = game.clock(feed.clock(polled))
+                    pushed += push.state.publish(
+                        "{}@{}".format(game.away, game.home),
+                        game_snapshot(game.home, game.away, stats, quarter,
+                                      clock))
+                lags.append(time.time() - emitted)
+            polls.append(time.time() - polled)
+            time.sleep(max(0, interval - (time.time() - polled)))
+    finally:
+        realtime.FEED_URL = feed_url
+        set_scheduler(scheduler)
+        push.stop()
+        server.shutdown()
+    elapsed = time.time() - start
+
+    # Throughput is per second spent polling, writing and pushing, since the
+    # replay's speed alone sets how fast plays arrive.
+    busy = sum(polls) or float('nan')
+    lags.sort()
+    polls.sort()
+    plays = sum(len(game.times) - 1 for game in games)
+    print("{} games, {} plays at {}x in {:.1f}s: {} polls ({} failed)".format(
+        len(games), plays, speed, elapsed, len(polls), errors))
+    if polls:
+        print("poll ms: p50 {:.0f}  p99 {:.0f}  max {:.0f};  {:.0f} rows "
+              "written/s, {:.1f} snapshots pushed/s of poll time".format(
+                  polls[len(polls) // 2] * 1000,
+                  polls[int(len(polls) * 0.99)] * 1000, polls[-1] * 1000,
+                  rows / busy, pushed / busy))
+    if lags:
+        print("emission to write{} lag ms: p50 {:.0f}  p99 {:.0f}  max "
+              "{:.0f}".format(" and push" if write else "",
+                              lags[len(lags) // 2] * 1000,
+                              lags[int(len(lags) * 0.99)] * 1000,
+                              lags[-1] * 1000))
+    return {"polls": len(polls), "errors": errors, "rows": rows,
+            "pushed": pushed}
+
+
+if __name__ == '__main__':
+    """Usage: python replay.py <speed> <gameid> [gameid ...]"""
+    run([int(gameid) for gameid in sys.argv[2:]], speed=float(sys.argv[1]))
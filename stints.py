@@ -0,0 +1,65 @@
+"""Lineup stints derived from the writer's staged player rows.
+
+A stint is a stretch of a game in which the players a team has on court do
+not change. The staged rows already carry the result of the substitution
+logic (`make_sub`, `sub_in`, `sub_out`, `check_for_inactive_players` and the
+adjustments they make to earlier rows) in their `in_game` flag, so a stint
+ends at the first snapshot where that set of players differs.
+
+Stints are as fine as the writer's granularity: at one snapshot per period
+a stint can't be shorter than a period.
+"""
+from itertools import groupby
+
+
+def snapshots(rows):
+    """Staged rows grouped into (first row, rows) per snapshot, in order."""
+    for _, group in groupby(rows, lambda row: (row['quarter'],
+                                               row['elapsed_seconds'])):
+        group = list(group)
+        yield group[0], group
+
+
+def lineup_stints(rows, home, away, gameid):
+    """(stint rows, stint player rows) for both teams of a game."""
+    stints, players = [], []
+    open_stints, counts = {}, dict((team, 0) for team in (home, away))
+    last = None
+    for first, group in snapshots(rows):
+        lineups = dict((team, frozenset()) for team in (home, away))
+        for row in group:
+            if row['in_game'] and row['team'] in lineups:
+                lineups[row['team']] |= frozenset([row['player']])
+        for team, lineup in lineups.items():
+            current = open_stints.get(team)
+            if current is not None and current[1] == lineup:
+                continue
+            if current is not None:
+                _close(current[0], first)
+            stint = {
+                "gameid": gameid,
+                "team": team,
+                "stint": counts[team],
+                "home": team == home,
+                "players": len(lineup),
+                "start_quarter": first['quarter'],
+                "start_elapsed": first['elapsed_seconds'],
+                "start_home_score": first['home_score'],
+                "start_away_score": first['away_score'],
+            }
+            stints.append(stint)
+            counts[team] += 1
+            players.extend({"gameid": gameid, "team": team,
+                            "stint": stint['stint'], "player": player}
+                           for player in sorted(lineup))
+            open_stints[team] = (stint, lineup)
+        last = first
+    for stint, _ in open_stints.values():
+        _close(stint, last)
+    return stints, players
+
+
+def _close(stint, row):
+    stint['end_elapsed'] = row['elapsed_seconds']
+    stint['end_home_score'] = row['home_score']
+    stint['end_away_score'] = row['away_score']
@@ -0,0 +1,472 @@
+"""Synthetic games for scale and stress testing, served as the ESPN pages the
+scraper parses.
+
+Every game is generated from (seed, gameid), so the same game comes back
+each time its pages are requested. `SyntheticOpener` stands in for the HTTP
+opener of a `FetchScheduler` and answers the play-by-play, box score, game
+and player page URLs `get_play_by_play`, `get_roster`, `set_starters` and
+`get_game_data` request, without touching the network.
+
+    set_scheduler(FetchScheduler(opener=SyntheticOpener(seed=1,
+                                                        overtimes=4)))
+
+`stress` pushes any number of synthetic games through
+`PlayByPlayToBoxScoreWriter` and reports time and memory as it goes, and
+time per play by game length at the end, so costs that grow faster than
+the number of plays stand out.
+
+Scores are not evened up before an overtime; overtimes happen when asked
+for, whatever the score.
+"""
+import cProfile
+import os
+import pstats
+import random
+import re
+import resource
+import sys
+import tempfile
+import time
+from cgi import escape
+from collections import Counter, OrderedDict
+from urllib2 import HTTPError
+from urlparse import parse_qs, urlparse
+
+from gameclock import OVERTIME_SECONDS, QUARTER_SECONDS
+
+
+FIRST_GAMEID = 900000000
+
+TEAMS = ['atl', 'bkn', 'bos', 'cha', 'chi', 'cle', 'dal', 'den', 'det', 'gs',
+         'hou', 'ind', 'lac', 'lal', 'mem', 'mia', 'mil', 'min', 'no', 'ny',
+         'okc', 'orl', 'phi', 'phx', 'por', 'sa', 'sac', 'tor', 'utah', 'wsh']
+
+FIRST_NAMES = ['Aaron', 'Andre', 'Ben', 'Carl', 'Chris', 'Dante', 'Derrick',
+               'Dwight', 'Eric', 'Gary', 'Isaiah', 'Jamal', 'Jeff', 'Jordan',
+               'Kemba', 'Kevin', 'Kyle', 'Lance', 'Marcus', 'Mike', 'Nick',
+               'Paul', 'Rajon', 'Rudy', 'Serge', 'Tony', 'Tyson', 'Victor',
+               'Wesley', 'Zach']
+LAST_NAMES = ['Allen', 'Baker', 'Brooks', 'Carter', 'Davis', 'Evans', 'Ford',
+              'Gibson', 'Green', 'Harris', 'Hill', 'Jackson', 'Johnson',
+              'Jones', 'Lee', 'Miller', 'Moore', 'Parker', 'Price', 'Reed',
+              'Robinson', 'Smith', 'Taylor', 'Thomas', 'Turner', 'Walker',
+              'Ward', 'White', 'Williams', 'Young']
+
+# Relative frequency of each kind of play, substitutions aside.
+PLAY_MIX = {
+    'two': 30,
+    'three': 12,
+    'shooting_foul': 7,
+    'foul': 6,
+    'rebound': 28,
+    'turnover': 8,
+    'block': 3,
+}
+
+# Text that no classifier rule matches, used to lengthen plays.
+FILLER = " after review at the scorer's table"
+
+ROSTER_SIZE = 13
+# Mean seconds of game clock between plays.
+PLAY_GAP = 6.5
+
+
+def _ordinal(n):
+    suffix = {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10 if n % 100 not in
+                                            (11, 12, 13) else 0, 'th')
+    return "{}{}".format(n, suffix)
+
+
+def _clock(seconds):
+    return "{}:{:02d}".format(seconds // 60, seconds % 60)
+
+
+def _poisson(rng, mean):
+    """Knuth's method; `mean` is always small here."""
+    limit, count, product = 2.718281828459045 ** -mean, 0, rng.random()
+    while product > limit:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+class SyntheticGame(object):
+    """
+    :param overtimes: number of overtime periods, or None to pick one the
+        way real games spread.
+    :param sub_rate: substitutions per minute of game clock.
+    :param mix: relative frequency of each kind of play, like `PLAY_MIX`.
+    :param play_length: minimum characters of a play's text.
+    :param quarter_changes: chance that a team changes a player between
+        periods without a substitution appearing in the play-by-play.
+    """
+
+    def __init__(self, gameid, seed=0, overtimes=None, sub_rate=1.0,
+                 mix=None, play_length=0, quarter_changes=0.5):
+        self.gameid = gameid
+        self.rng = rng = random.Random("{}:{}".format(seed, gameid))
+        self.away, self.home = rng.sample(TEAMS, 2)
+        names = rng.sample([(first, last) for first in FIRST_NAMES
+                            for last in LAST_NAMES], 2 * ROSTER_SIZE)
+        names = [" ".join(name) for name in names]
+        self.roster = OrderedDict([(self.away, names[:ROSTER_SIZE]),
+                                   (self.home, names[ROSTER_SIZE:])])
+        if overtimes is None:
+            overtimes = 0
+            while rng.random() < (0.06 if overtimes == 0 else 0.2):
+                overtimes += 1
+        self.overtimes = overtimes
+        self.sub_rate = sub_rate
+        self.mix = sorted((mix or PLAY_MIX).items())
+        self.play_length = play_length
+        self.quarter_changes = quarter_changes
+        self.scores = {self.away: 0, self.home: 0}
+        self.periods = [self._period(period)
+                        for period in range(1, 5 + overtimes)]
+
+    @property
+    def starters(self):
+        return [player for players in self.roster.values()
+                for player in players[:5]]
+
+    def _period(self, period):
+        rng = self.rng
+        if period == 1:
+            self.on = dict((team, players[:5])
+                           for team, players in self.roster.items())
+        else:
+            for team, players in self.roster.items():
+                if rng.random() < self.quarter_changes:
+                    bench = [p for p in players if p not in self.on[team]]
+                    self.on[team][rng.randrange(5)] = rng.choice(bench)
+        length = QUARTER_SECONDS if period <= 4 else OVERTIME_SECONDS
+        plays, clock = [], length
+        while True:
+            gap = int(rng.expovariate(1.0 / PLAY_GAP))
+            if clock - gap <= 0:
+                break
+            clock -= gap
+            for _ in range(_poisson(rng, self.sub_rate * gap / 60.0)):
+                plays.append(self._substitution(clock))
+            plays.extend(self._pad(row) for row in self._plays(clock))
+        name = "Overtime" if period > 4 else "Quarter"
+        number = period - 4 if period > 4 else period
+        plays.append(self._row(0, self.home, "End of the {} {}".format(
+            _ordinal(number), name)))
+        if period == 4 + self.overtimes:
+            plays.append(self._row(0, self.home, "End of Game"))
+        return plays
+
+    def _row(self, clock, team, play):
+        return (_clock(clock), team, play,
+                self.scores[self.away], self.scores[self.home])
+
+    def _pad(self, row):
+        """Lengthens a play to `play_length`. Substitutions and period ends
+        are left alone, since the writer matches them as whole strings."""
+        play = row[2]
+        if len(play) < self.play_length:
+            play += FILLER * (
+                (self.play_length - len(play)) // len(FILLER) + 1)
+        return row[:2] + (play,) + row[3:]
+
+    def _substitution(self, clock):
+        team = self.rng.choice(list(self.roster))
+        bench = [p for p in self.roster[team] if p not in self.on[team]]
+        slot = self.rng.randrange(5)
+        player, replaced = self.rng.choice(bench), self.on[team][slot]
+        self.on[team][slot] = player
+        return self._row(clock, team, "{} enters the game for {}".format(
+            player, replaced))
+
+    def _pick(self):
+        total = sum(weight for _, weight in self.mix)
+        choice = self.rng.uniform(0, total)
+        for kind, weight in self.mix:
+            choice -= weight
+            if choice <= 0:
+                return kind
+        return self.mix[-1][0]
+
+    def _plays(self, clock):
+        rng = self.rng
+        team = rng.choice(list(self.roster))
+        other = self.away if team == self.home else self.home
+        player = rng.choice(self.on[team])
+        teammate = rng.choice([p for p in self.on[team] if p != player])
+        opponent = rng.choice(self.on[other])
+        kind = self._pick()
+        made = rng.random() < 0.47
+        if kind in ('two', 'three'):
+            points = 2 if kind == 'two' else 3
+            shot = "{}-foot {}".format(
+                rng.randint(1, 22), rng.choice(['jumper', 'layup', 'dunk'])) \
+                if points == 2 else "{}-foot three point jumper".format(
+                rng.randint(23, 30))
+            if not made:
+                return [self._row(clock, team, "{} misses {}".format(
+                    player, shot))]
+            self.scores[team] += points
+            assist = " ({} assists)".format(teammate) \
+                if rng.random() < 0.6 else ""
+            return [self._row(clock, team, "{} makes {}{}".format(
+                player, shot, assist))]
+        elif kind == 'shooting_foul':
+            rows = [self._row(clock, other, "{} shooting foul ({} draws the "
+                                            "foul)".format(opponent, player))]
+            for shot in (1, 2):
+                verb = "makes" if rng.random() < 0.77 else "misses"
+                if verb == "makes":
+                    self.scores[team] += 1
+                rows.append(self._row(clock, team, "{} {} free throw {} of "
+                                                   "2".format(player, verb,
+                                                              shot)))
+            return rows
+        elif kind == 'foul':
+            return [self._row(clock, other, "{} personal foul".format(
+                opponent))]
+        elif kind == 'rebound':
+            side = "offensive" if rng.random() < 0.25 else "defensive"
+            return [self._row(clock, team, "{} {} rebound".format(
+                player, side))]
+        elif kind == 'turnover':
+            if rng.random() < 0.5:
+                return [self._row(clock, team, "{} bad pass ({} steals)"
+                                               .format(player, opponent))]
+            return [self._row(clock, team, "{} traveling turnover".format(
+                player))]
+        return [self._row(clock, other, "{} blocks {} 's layup".format(
+            opponent, player))]
+
+    #########
+    # PAGES #
+    #########
+
+    def _logo(self, team):
+        return '<img src="http://a.espncdn.com/i/teamlogos/nba/500/{}.png"/>' \
+            .format(team)
+
+    def player_url(self, team, index):
+        side = 'home' if team == self.home else 'away'
+        return "http://www.espn.com/nba/player/_/id/{}/{}/{}".format(
+            self.gameid, side, index)
+
+    def playbyplay_page(self):
+        tables = []
+        for plays in self.periods:
+            rows = ["<tr><th>time</th><th>team</th><th>play</th>"
+                    "<th>score</th></tr>"]
+            for clock, team, play, away, home in plays:
+                rows.append(
+                    "<tr><td>{}</td><td>{}</td><td>{}</td><td>{} - {}</td>"
+                    "</tr>".format(clock, self._logo(team), escape(play),
+                                   away, home))
+            tables.append("<table>{}</table>".format("".join(rows)))
+        return ('<html><body><div class="away">{}</div>'
+                '<div class="home">{}</div>'
+                '<article class="play-by-play">{}</article>'
+                '</body></html>').format(self._logo(self.away),
+                                         self._logo(self.home),
+                                         "".join(tables))
+
+    def boxscore_page(self):
+        wraps = []
+        for team, players in self.roster.items():
+            side = 'home' if team == self.home else 'away'
+            rows = ['<tr><td><a href="{}">{}</a></td></tr>'.format(
+                self.player_url(team, i), player)
+                for i, player in enumerate(players)]
+            wraps.append(
+                '<div class="gamepackage-{}-wrap"><div class="hide-bench">'
+                '<table><tr><th>starters</th></tr>{}</table></div></div>'
+                .format(side, "".join(rows)))
+        return "<html><body>{}</body></html>".format("".join(wraps))
+
+    def player_page(self, side, index):
+        team = self.home if side == 'home' else self.away
+        return ('<html><body><div><div class="mod-content"><h1>{}</h1>'
+                '</div></div></body></html>').format(
+            self.roster[team][int(index)])
+
+    def game_page(self):
+        rng = random.Random(self.gameid)
+        capacity = rng.randint(17000, 21000)
+        return (
+            '<html><head><title>{} vs. {} - Game Summary - October {}, 2016 '
+            '- ESPN</title></head><body>'
+            '<div class="location-details"><ul><li>Synthetic Arena, '
+            'Springfield</li></ul></div>'
+            '<div class="game-info"><div class="capacity">Attendance: {:,}'
+            '</div><div class="attendance"><div class="capacity">Capacity: '
+            '{:,}</div></div></div>'
+            '<div class="game-info-note"><span>Referees: A Ref, B Ref, C Ref'
+            '</span></div></body></html>').format(
+            self.away.upper(), self.home.upper(), rng.randint(1, 31),
+            rng.randint(12000, capacity), capacity)
+
+
+class SyntheticResponse(object):
+    def __init__(self, url, body):
+        self.url = url
+        self.body = body
+
+    def read(self):
+        return self.body
+
+    def geturl(self):
+        return self.url
+
+    def getcode(self):
+        return 200
+
+
+class SyntheticOpener(object):
+    """Answers the scraper's ESPN requests with synthetic games. Keyword
+    arguments are passed on to every `SyntheticGame`."""
+
+    def __init__(self, seed=0, cache=4, **options):
+        self.seed = seed
+        self.options = options
+        self.cache = cache
+        self.games = OrderedDict()
+        self.requests = 0
+
+    def game(self, gameid):
+        gameid = int(gameid)
+        if gameid not in self.games:
+            self.games[gameid] = SyntheticGame(
+                gameid, self.seed, **self.options)
+            while len(self.games) > self.cache:
+                self.games.popitem(last=False)
+        return self.games[gameid]
+
+    def open(self, url, timeout=None):
+        self.requests += 1
+        parsed = urlparse(url)
+        query = parse_qs(parsed.query)
+        player = re.match(r'^/nba/player/_/id/(\d+)/(home|away)/(\d+)$',
+                          parsed.path)
+        if player:
+            body = self.game(player.group(1)).player_page(
+                player.group(2), player.group(3))
+        elif parsed.path == '/nba/playbyplay':
+            body = self.game(query['gameId'][0]).playbyplay_page()
+        elif parsed.path == '/nba/boxscore':
+            body = self.game(query['gameId'][0]).boxscore_page()
+        elif parsed.path == '/nba/game':
+            body = self.game(query['gameId'][0]).game_page()
+        else:
+            raise HTTPError(url, 404, "Not Found", {}, None)
+        return SyntheticResponse(url, body)
+
+
+##########
+# STRESS #
+##########
+
+def _max_rss_mb():
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def stress(games=1000, seed=0, write=False, profile=False, report=100,
+           first_gameid=FIRST_GAMEID, **options):
+    """Runs `games` synthetic games, numbered from `first_gameid`, through
+    the writer, computing (and with `write`, writing) each one, and reports
+    throughput and memory. Rows left by an earlier run of the same games are
+    deleted before each game.
+
+    Runs against a temporary SQLite database unless NBA_DB_URI is set, since
+    the writer stores every game's parsed plays.
+    """
+    temporary = 'NBA_DB_URI' not in os.environ
+    if temporary:
+        handle, path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        os.environ['NBA_DB_URI'] = 'sqlite:///{}'.format(path)
+    from fetch import FetchScheduler, get_scheduler, set_scheduler
+    scheduler = get_scheduler()
+    try:
+        set_scheduler(FetchScheduler(
+            rate=1e6, burst=1e6, max_rate=1e6, initial_concurrency=1,
+            opener=SyntheticOpener(seed, **options)))
+        _stress(games, write, profile, report, first_gameid)
+    finally:
+        set_scheduler(scheduler)
+        if temporary:
+            del os.environ['NBA_DB_URI']
+
+
+def _stress(games, write, profile, report, first_gameid):
+    from playbyplay import PlayByPlayToBoxScoreWriter
+    from db import box_score_tables, db, delete_game_rows, game_table
+
+    profiler = cProfile.Profile() if profile else None
+    timings = []
+    # A game the writer chokes on is a finding, not a reason to stop: count
+    # failures by exception type and carry on with the next game.
+    failures = Counter()
+    start = time.time()
+    for n, gameid in enumerate(
+            range(first_gameid, first_gameid + games), 1):
+        if write:
+            delete_game_rows(db.engine, gameid)
+        began = time.time()
+        if profiler:
+            profiler.enable()
+        try:
+            game = PlayByPlayToBoxScoreWriter(
+                *box_score_tables(gameid), game_table=game_table,
+                gameid=gameid)
+            game.compute()
+            if write:
+                game.write()
+        except Exception as e:
+            if not failures[type(e).__name__]:
+                print("Game {} failed: {!r}".format(gameid, e))
+            failures[type(e).__name__] += 1
+        else:
+            timings.append((len(game.pbp), time.time() - began))
+        finally:
+            if profiler:
+                profiler.disable()
+        if (n % report == 0 or n == games) and timings:
+            recent = timings[-report:]
+            print("{:>8} games {:6.1f} games/s  {:7.1f} ms/game  {:5.2f} ms/play"
+                  "  max rss {:.0f} MB  {} failed".format(
+                      n, n / (time.time() - start),
+                      1000 * sum(t for _, t in recent) / len(recent),
+                      1000 * sum(t for _, t in recent) /
+                      max(1, sum(plays for plays, _ in recent)),
+                      _max_rss_mb(), sum(failures.values())))
+
+    if failures:
+        print("\n{} of {} games failed:".format(sum(failures.values()), games))
+        for name, count in failures.most_common():
+            print("{:>8} {}".format(count, name))
+
+    # Time per play should not grow with the length of the game.
+    timings.sort()
+    buckets = 5
+    print("\n{:>16} {:>10} {:>10}".format("plays per game", "ms/game",
+                                          "ms/play"))
+    for i in range(buckets):
+        bucket = timings[i * len(timings) // buckets:
+                         (i + 1) * len(timings) // buckets]
+        if not bucket:
+            continue
+        plays = sum(p for p, _ in bucket)
+        seconds = sum(t for _, t in bucket)
+        print("{:>7}-{:<8} {:>10.1f} {:>10.3f}".format(
+            bucket[0][0], bucket[-1][0], 1000 * seconds / len(bucket),
+            1000 * seconds / plays))
+    if profiler:
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+
+
+if __name__ == '__main__':
+    """Usage: python synthetic.py [games] [overtimes] [sub_rate]"""
+    args = sys.argv[1:]
+    stress(int(args[0]) if args else 1000,
+           overtimes=int(args[1]) if len(args) > 1 else None,
+           sub_rate=float(args[2]) if len(args) > 2 else 1.0)
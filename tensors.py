@@ -0,0 +1,158 @@
+"""Exports team snapshots as one memory-mapped tensor for model training.
+
+Every game becomes a fixed-shape block of (timesteps, 2, stats) float32
+values: one timestep per second of game clock (forward filled between
+snapshots and zero padded after the final buzzer), the home team first, and
+the stat columns in `COLUMNS`. Blocks are written back to back in shuffled
+order to `<path>.dat`, next to an index (`<path>.index.npy`) giving each
+game's id, position, length and result, and a small json header.
+"""
+import json
+import random
+import sys
+
+import numpy as np
+from sqlalchemy import and_, case, func, select
+
+from db import STAT_COLUMNS, db, parsed_games, team_box_score_all
+from gameclock import OVERTIME_SECONDS, REGULATION_SECONDS
+from prefix import window_totals
+
+
+COLUMNS = ['PIR'] + STAT_COLUMNS
+
+INDEX_DTYPE = np.dtype([('gameid', np.int64), ('offset', np.int64),
+                        ('timesteps', np.int32), ('home_won', np.int8)])
+
+
+def _games(gameids=None):
+    """(gameid, home team, last elapsed second) of every game with team
+    snapshots. Games missing from `parsed_games` (written before it existed)
+    take their home team from the winner columns of their snapshots; games
+    where those are empty too are skipped."""
+    box_scores = team_box_score_all
+    home_team = func.max(case([
+        (and_(box_scores.c.winner == 'home',
+              box_scores.c.team == box_scores.c.winning_team),
+         box_scores.c.team),
+        (and_(box_scores.c.winner == 'away',
+              box_scores.c.team != box_scores.c.winning_team),
+         box_scores.c.team),
+    ]))
+    query = select([
+        box_scores.c.gameid,
+        func.coalesce(func.max(parsed_games.c.home), home_team),
+        func.max(box_scores.c.elapsed_seconds),
+    ]).select_from(box_scores.outerjoin(
+        parsed_games, parsed_games.c.gameid == box_scores.c.gameid,
+    )).group_by(box_scores.c.gameid)
+    if gameids is not None:
+        query = query.where(box_scores.c.gameid.in_(gameids))
+    games = [tuple(row) for row in db.engine.execute(query)]
+    skipped = [gameid for gameid, home, _ in games if home is None]
+    if skipped:
+        print("Skipping {} games with no home team: {}".format(
+            len(skipped), skipped))
+    return [game for game in games if game[1] is not None]
+
+
+def _snapshots(gameid):
+    box_scores = team_box_score_all
+    columns = [box_scores.c[name] for name in COLUMNS]
+    query = select([box_scores.c.elapsed_seconds, box_scores.c.team,
+                    box_scores.c.winner] + columns).where(
+        box_scores.c.gameid == gameid).order_by(
+        box_scores.c.quarter, box_scores.c.elapsed_seconds)
+    return db.engine.execute(query)
+
+
+def _fill_game(block, gameid, home):
+    """Writes a game's snapshots into its block, returning (timesteps,
+    home_won)."""
+    last = -1
+    home_won = 0
+    for row in _snapshots(gameid):
+        elapsed = row[0]
+        side = 0 if row[1] == home else 1
+        if elapsed > last:
+            block[last + 1:elapsed + 1] = block[last] if last >= 0 else 0
+        block[elapsed, side] = [value or 0 for value in row[3:]]
+        home_won = int(row[2] == 'home')
+        last = max(last, elapsed)
+    return last + 1, home_won
+
+
+def _memmap(path, dtype, mode, shape):
+    # numpy can't map an empty file, so an export of no games is an empty
+    # .dat file read back as an empty array.
+    if not shape[0]:
+        if mode == 'w+':
+            open(path, 'wb').close()
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+
+
+def export(path, gameids=None, seed=0):
+    games = _games(gameids)
+    overtimes = max([0] + [
+        -(-(elapsed - REGULATION_SECONDS) // OVERTIME_SECONDS)
+        for _, _, elapsed in games])
+    timesteps = REGULATION_SECONDS + overtimes * OVERTIME_SECONDS + 1
+    shape = (len(games), timesteps, 2, len(COLUMNS))
+    random.Random(seed).shuffle(games)
+
+    data = _memmap(path + '.dat', np.float32, 'w+', shape)
+    index = np.zeros(len(games), dtype=INDEX_DTYPE)
+    for offset, (gameid, home, _) in enumerate(games):
+        length, home_won = _fill_game(data[offset], gameid, home)
+        index[offset] = (gameid, offset, length, home_won)
+        print("Exported {} ({} timesteps)".format(gameid, length))
+    if games:
+        data.flush()
+    np.save(path + '.index.npy', index)
+    with open(path + '.json', 'w') as f:
+        json.dump({"shape": shape, "dtype": "float32", "columns": COLUMNS,
+                   "teams": ["home", "away"]}, f)
+    return shape
+
+
+class SnapshotDataset(object):
+    """Read-only view of an export.
+
+    `batches` hands out slices of the memory map, so nothing is copied or
+    read until a batch is used. Games were shuffled when exported; each epoch
+    shuffles the order of the batches.
+    """
+
+    def __init__(self, path):
+        with open(path + '.json') as f:
+            self.header = json.load(f)
+        self.columns = self.header['columns']
+        self.data = _memmap(path + '.dat', self.header['dtype'], 'r',
+                            tuple(self.header['shape']))
+        self.index = np.load(path + '.index.npy', mmap_mode='r')
+
+    def __len__(self):
+        return len(self.index)
+
+    def game(self, gameid):
+        offset = int(np.flatnonzero(self.index['gameid'] == gameid)[0])
+        return self.data[offset, :self.index['timesteps'][offset]]
+
+    def rolling(self, gameid, seconds, at=None):
+        """Both teams' totals over the `seconds` up to every second (or
+        each second in `at`) of a game, from its forward-filled block."""
+        return window_totals(self.game(gameid), seconds, at)
+
+    def batches(self, batch_size, seed=None):
+        """Yields (snapshots, index rows) for consecutive runs of games."""
+        starts = list(range(0, len(self), batch_size))
+        random.Random(seed).shuffle(starts)
+        for start in starts:
+            stop = start + batch_size
+            yield self.data[start:stop], self.index[start:stop]
+
+
+if __name__ == '__main__':
+    """Usage: python tensors.py <path>"""
+    print(export(sys.argv[1] if len(sys.argv) > 1 else 'snapshots'))
@@ -0,0 +1,68 @@
+"""Shared fixtures: every test runs against a fresh SQLite database and
+scrapes synthetic games instead of ESPN."""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+_handle, _path = tempfile.mkstemp(suffix='.db')
+os.close(_handle)
+os.environ['NBA_DB_URI'] = 'sqlite:///{}'.format(_path)
+
+import pytest
+
+import synthetic
+from db import box_score_tables, game_table
+from events import store_parsed_game
+from fetch import FetchScheduler, set_scheduler
+from playbyplay import PlayByPlayToBoxScoreWriter
+
+
+PLAY_KEYS = ['quarter', 'time', 'team', 'home_score', 'away_score', 'play']
+
+
+_gameids = iter(range(synthetic.FIRST_GAMEID, synthetic.FIRST_GAMEID + 10 ** 6))
+
+
+@pytest.fixture
+def new_gameids():
+    """Reserves `n` consecutive gameids no other test uses."""
+    return lambda n=1: [next(_gameids) for _ in range(n)]
+
+
+@pytest.fixture
+def synthetic_game():
+    """Builds (and computes) the writer of a synthetic game made with the
+    given `SyntheticGame` options; writer options go in `writer`. Each call
+    makes a new game unless `gameid` is given."""
+    def build(seed=0, writer=None, gameid=None, **options):
+        opener = synthetic.SyntheticOpener(seed, **options)
+        set_scheduler(FetchScheduler(
+            rate=1e6, burst=1e6, max_rate=1e6, initial_concurrency=1,
+            opener=opener))
+        if gameid is None:
+            gameid = next(_gameids)
+        game = PlayByPlayToBoxScoreWriter(
+            *box_score_tables(gameid), game_table=game_table, gameid=gameid,
+            **(writer or {}))
+        game.compute()
+        return game
+    return build
+
+
+@pytest.fixture
+def stored_game():
+    """Builds (and computes) the writer of a game stored from the given
+    plays, each a list of the values in `PLAY_KEYS`."""
+    def build(plays, home, away, winner, roster, starters, writer=None):
+        gameid = next(_gameids)
+        store_parsed_game(
+            gameid, [dict(zip(PLAY_KEYS, play)) for play in plays],
+            home, away, winner, roster, starters)
+        game = PlayByPlayToBoxScoreWriter(
+            *box_score_tables(gameid), game_table=game_table, gameid=gameid,
+            from_store=True, **(writer or {}))
+        game.compute()
+        return game
+    return build
@@ -0,0 +1,95 @@
+import sys
+import threading
+
+import pytest
+from sqlalchemy import func, select
+
+from asyncwriter import AsyncWriter
+from db import (
+    db, game_data, lineup_stints, stint_players, team_box_score,
+    team_box_score_all,
+)
+
+
+def _written(gameid):
+    return db.engine.execute(select([func.count()]).where(
+        team_box_score_all.c.gameid == gameid)).scalar()
+
+
+def test_writes_on_the_writer_thread(synthetic_game):
+    games = [synthetic_game(seed) for seed in range(3)]
+    failures = []
+    with AsyncWriter(on_error=lambda key, e: failures.append(e)) as writer:
+        for game in games:
+            writer.submit(game.gameid, game.write)
+    assert failures == []
+    assert writer.written == 3
+    for game in games:
+        assert _written(game.gameid) == len(game.team_rows)
+
+
+def test_failed_write_leaves_nothing_behind(synthetic_game, monkeypatch):
+    game = synthetic_game()
+
+    def fail(conn):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(game, 'write_stint_data', fail)
+    with pytest.raises(RuntimeError):
+        game.write()
+    assert _written(game.gameid) == 0
+
+
+def test_failed_rewrite_keeps_the_old_rows(synthetic_game, monkeypatch):
+    game = synthetic_game()
+    game.write()
+
+    def fail(conn):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(game, 'write_stint_data', fail)
+    with pytest.raises(RuntimeError):
+        game.write(replace=[team_box_score, lineup_stints, stint_players,
+                            game_data])
+    assert _written(game.gameid) == len(game.team_rows)
+
+
+def test_failing_error_handler_does_not_stop_the_writer(capsys):
+    def broken_handler(key, e):
+        raise RuntimeError("database is locked")
+
+    def fail():
+        raise ValueError("bad game")
+    written = []
+    with AsyncWriter(maxsize=1, on_error=broken_handler) as writer:
+        for key in range(4):
+            writer.submit(key, fail)
+        writer.submit(4, lambda: written.append(4))
+    assert writer.failed == 4
+    assert writer.written == 1
+    assert written == [4]
+    assert "database is locked" in capsys.readouterr().out
+
+
+def test_submit_and_close_give_up_on_a_dead_writer():
+    release = threading.Event()
+
+    def die():
+        release.wait()
+        sys.exit()
+    writer = AsyncWriter(maxsize=1).start()
+    writer.submit(0, die)
+    writer.submit(1, lambda: None)
+    errors = []
+
+    def submit():
+        try:
+            writer.submit(2, lambda: None)
+        except RuntimeError as e:
+            errors.append(e)
+    blocked = threading.Thread(target=submit)
+    blocked.start()
+    release.set()
+    blocked.join(5)
+    assert not blocked.is_alive()
+    assert len(errors) == 1
+    writer.close()
+    assert writer.thread is None
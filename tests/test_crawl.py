@@ -0,0 +1,34 @@
+from sqlalchemy import select
+
+import valid_gameids
+from db import crawled_schedules, db, game_registry
+from fetch import FetchError
+
+
+SEASON = 2070
+URL = "http://www.espn.com/nba/team/schedule/_/name/{}/year/2070"
+
+
+def test_failed_schedule_page_does_not_stop_the_crawl(monkeypatch, capsys):
+    def schedule_games(season, url):
+        team = valid_gameids.team_abbreviation(url)
+        if team == 'bos':
+            raise FetchError("Gave up on {}".format(url))
+        gameid = {'atl': 700000001, 'cle': 700000002}[team]
+        return season, team, [{"gameid": gameid, "season": season,
+                               "date": "Wed, Nov 1", "home": team,
+                               "away": 'gs'}]
+    monkeypatch.setattr(valid_gameids, 'team_links', lambda season: [
+        URL.format(team) for team in ['atl', 'bos', 'cle']])
+    monkeypatch.setattr(valid_gameids, 'schedule_games', schedule_games)
+
+    valid_gameids.crawl([SEASON], concurrency=2)
+    assert "1 of 3 schedules failed" in capsys.readouterr().out
+    assert valid_gameids.covered_teams(SEASON) == set(['atl', 'cle'])
+    registered = db.engine.execute(select([game_registry.c.gameid]).where(
+        game_registry.c.season == SEASON))
+    assert sorted(row[0] for row in registered) == [700000001, 700000002]
+    assert valid_gameids.pending_schedules([SEASON]) == [
+        (SEASON, URL.format('bos'))]
+    assert db.engine.execute(select([crawled_schedules]).where(
+        crawled_schedules.c.team == 'bos')).first() is None
@@ -0,0 +1,20 @@
+import pytest
+
+from playbyplay import EVENT, PERIOD
+
+
+def _minutes(game):
+    return dict(((row['quarter'], row['time'], row['player']),
+                 (row['in_game'], row['MIN'])) for row in game.rows)
+
+
+@pytest.mark.parametrize('seed,granularity', [
+    (0, 30), (0, PERIOD), (3, EVENT)])
+def test_minutes_match_second_granularity(synthetic_game, seed, granularity):
+    fine = synthetic_game(seed, overtimes=1)
+    coarse = synthetic_game(seed, overtimes=1, gameid=fine.gameid,
+                            writer={'granularity': granularity})
+    expected = _minutes(fine)
+    snapshots = _minutes(coarse)
+    assert len(snapshots) < len(expected)
+    assert dict((key, expected.get(key)) for key in snapshots) == snapshots
@@ -0,0 +1,39 @@
+import json
+import os
+
+from sqlalchemy import select
+
+from db import db, player_box_score_all, team_box_score_all
+from playbyplay import DATABASE, NORMALIZED, WIDE
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def _rows(table, gameid):
+    query = select([table]).where(table.c.gameid == gameid).order_by(
+        *[column for column in table.primary_key])
+    return [dict((key, value) for key, value in row.items()
+                 if key != 'gameid')
+            for row in db.engine.execute(query)]
+
+
+def test_normalized_reads_back_as_wide(stored_game):
+    with open(os.path.join(FIXTURES, 'recorded_game.json')) as f:
+        recorded = json.load(f)
+    games = dict((layout, stored_game(
+        recorded['pbp'], recorded['home'], recorded['away'],
+        recorded['winner'], recorded['roster'], recorded['starters'],
+        writer={'granularity': 30, 'team_aggregation': DATABASE,
+                'player_layout': layout}))
+        for layout in (WIDE, NORMALIZED))
+    for game in games.values():
+        game.write()
+
+    wide, normalized = games[WIDE].gameid, games[NORMALIZED].gameid
+    players = _rows(player_box_score_all, wide)
+    assert players
+    assert _rows(player_box_score_all, normalized) == players
+    teams = _rows(team_box_score_all, wide)
+    assert teams
+    assert _rows(team_box_score_all, normalized) == teams
@@ -0,0 +1,20 @@
+from livepush import game_snapshot, seconds_remaining, win_probability
+
+
+def test_seconds_remaining_in_overtime():
+    assert seconds_remaining(1, "12:00") == 48 * 60
+    assert seconds_remaining(4, "0:00") == 0
+    assert seconds_remaining(5, "4:00") == 4 * 60
+    assert seconds_remaining(7, "0:30") == 30
+
+
+def test_overtime_lead_is_not_a_certainty():
+    probability = win_probability(1, seconds_remaining(5, "4:00"))
+    assert 0.5 < probability < 0.7
+
+
+def test_no_probability_without_a_clock():
+    stats = {'cle': [{'PTS': 10}], 'gs': [{'PTS': 8}]}
+    assert game_snapshot('cle', 'gs', stats)['home_win_probability'] is None
+    snapshot = game_snapshot('cle', 'gs', stats, 4, "1:00")
+    assert snapshot['home_win_probability'] > 0.5
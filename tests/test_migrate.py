@@ -0,0 +1,43 @@
+from sqlalchemy import Index, MetaData, Table, create_engine, inspect
+
+import db
+
+
+def _old_schema(engine):
+    """The box score tables as user-026 through user-037 created them: no
+    season column in the key, and no BLKD."""
+    old = MetaData()
+    for table in [db.team_box_score, db.player_box_score]:
+        copy = Table(table.name, old, *[
+            column.copy() for column in table.columns
+            if column.name not in ('season', 'BLKD')])
+        for index in table.indexes:
+            Index(index.name, *[copy.c[column.name]
+                                for column in index.columns])
+    old.create_all(engine)
+
+
+def test_migrates_tables_without_season(tmpdir):
+    engine = create_engine('sqlite:///{}'.format(tmpdir.join('old.db')))
+    _old_schema(engine)
+    engine.execute(
+        "INSERT INTO team_box_score (gameid, quarter, elapsed_seconds, team,"
+        " time, \"PTS\") VALUES (1, 1, 10, 'cle', '11:50', 2)")
+    engine.execute(
+        "INSERT INTO player_box_score (gameid, quarter, elapsed_seconds,"
+        " player, time, team, \"PTS\") VALUES (1, 1, 10, 'A', '11:50', 'cle',"
+        " 2)")
+
+    db.create_schema(engine)
+
+    assert engine.execute(
+        "SELECT season, \"PTS\" FROM team_box_score_all").fetchall() == [(0, 2)]
+    assert engine.execute(
+        "SELECT season, \"PTS\" FROM player_box_score_all").fetchall() == \
+        [(0, 2)]
+    inspector = inspect(engine)
+    for table in [db.team_box_score, db.player_box_score]:
+        assert inspector.get_pk_constraint(table.name)[
+            'constrained_columns'][:2] == ['gameid', 'season']
+        assert set(index['name'] for index in inspector.get_indexes(
+            table.name)) == set(index.name for index in table.indexes)
@@ -0,0 +1,78 @@
+import json
+import os
+
+from oncourt import OnCourt
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def test_masks():
+    court = OnCourt({'cle': ['A', 'B', 'C'], 'gs': ['D']}, ['A', 'D'])
+    assert 'A' in court and 'B' not in court and 'X' not in court
+    assert court.snapshot() == {'cle': 0b001, 'gs': 0b1}
+    assert court.enter('B') and not court.enter('B')
+    assert court.leave('A') and not court.leave('A')
+    assert sorted(court) == ['B', 'D']
+    assert court.decode('cle', 0b110) == ['B', 'C']
+    assert court.enter('E', 'gs')
+    assert court.decode('gs', court.snapshot()['gs']) == ['D', 'E']
+
+
+def test_adjacent_inactive_players_all_leave():
+    court = OnCourt({'cle': ['A', 'B', 'C', 'D']}, ['A', 'B', 'C', 'D'])
+    court.mark_played('D')
+    assert court.inactive() == ['A', 'B', 'C']
+    for player in court.inactive():
+        court.leave(player)
+    assert list(court) == ['D']
+    court.new_quarter()
+    assert court.inactive() == ['D']
+
+
+def _load(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return json.load(f)
+
+
+def test_matches_recorded_minutes(stored_game):
+    # recorded_game.json is synthetic game 900000003 (seed 3, sub_rate 4,
+    # quarter_changes 1, one overtime); recorded_game_minutes.json is where
+    # each player's (in_game, MIN) changed when the writer from before
+    # `OnCourt` ran it at SECOND granularity.
+    recorded = _load('recorded_game.json')
+    game = stored_game(recorded['pbp'], recorded['home'], recorded['away'],
+                       recorded['winner'], recorded['roster'],
+                       recorded['starters'])
+    changes, last = {}, {}
+    for row in game.rows:
+        value = [row['in_game'], row['MIN']]
+        if last.get(row['player']) != value:
+            changes.setdefault(row['player'], []).append(
+                [row['quarter'], row['time']] + value)
+            last[row['player']] = value
+    expected = _load('recorded_game_minutes.json')
+    assert sorted(changes) == sorted(expected)
+    for player in expected:
+        assert changes[player] == expected[player], player
+
+
+def test_sub_out_of_unseen_player(stored_game):
+    # A lineup change at the start of the 2nd isn't in the play-by-play, and
+    # the player it brought on is subbed out before any play of theirs.
+    roster = {'cle': ['Cal Ames', 'Cal Bell', 'Cal Cole', 'Cal Dunn',
+                      'Cal Ford', 'Cal Gray', 'Cal Hart'],
+              'gs': ['Gus Ames', 'Gus Bell', 'Gus Cole', 'Gus Dunn',
+                     'Gus Ford']}
+    plays = [
+        [1, '11:40', 'cle', 0, 0, 'Cal Ames misses 10-foot jumper'],
+        [1, '0:00', 'cle', 0, 0, 'End of the 1st Quarter'],
+        [2, '11:30', 'cle', 0, 0, 'Cal Hart enters the game for Cal Gray'],
+        [2, '11:10', 'cle', 0, 0, 'Cal Hart misses 10-foot jumper'],
+        [2, '0:00', 'cle', 0, 0, 'End of Game'],
+    ]
+    game = stored_game(plays, 'cle', 'gs', 'cle', roster,
+                       roster['cle'][:5] + roster['gs'])
+    assert 'Cal Gray' in game.seconds_played_by_player
+    rows = [row for row in game.rows if row['player'] == 'Cal Gray']
+    assert not rows[-1]['in_game']
@@ -0,0 +1,30 @@
+from sqlalchemy import func, select
+
+from db import db, team_box_score_all
+from gameclock import OVERTIME_SECONDS, REGULATION_SECONDS
+
+
+def test_overtime_snapshots_are_unique(synthetic_game):
+    game = synthetic_game(overtimes=2)
+    keys = [(row['quarter'], row['elapsed_seconds'], row['team'])
+            for row in game.team_rows]
+    assert len(keys) == len(set(keys))
+    assert max(quarter for quarter, _, _ in keys) == 6
+    elapsed = [e for _, e, team in keys if team == game.home]
+    assert elapsed == sorted(set(elapsed))
+    assert elapsed[-1] < REGULATION_SECONDS + 2 * OVERTIME_SECONDS
+
+
+def test_overtime_starts_at_five_minutes(synthetic_game):
+    game = synthetic_game(overtimes=1)
+    times = [row['time'] for row in game.team_rows if row['quarter'] == 5]
+    assert times[0] in ("4:59", "5:00")
+    assert max(int(time.split(':')[0]) for time in times) <= 5
+
+
+def test_overtime_game_writes(synthetic_game):
+    game = synthetic_game(overtimes=1)
+    game.write()
+    written = db.engine.execute(select([func.count()]).where(
+        team_box_score_all.c.gameid == game.gameid)).scalar()
+    assert written == len(game.team_rows)
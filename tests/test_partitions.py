@@ -0,0 +1,45 @@
+from sqlalchemy import event
+
+from db import (
+    _partitions, db, delete_game_rows, drop_season, game_registry,
+    season_partition, team_box_score,
+)
+
+
+def test_partition_is_created_again_after_a_drop():
+    partition = season_partition(db.engine, team_box_score, 2080)
+    drop_season(db.engine, 2080)
+    assert not db.engine.has_table(partition.name)
+    assert season_partition(db.engine, team_box_score, 2080) is partition
+    assert db.engine.has_table(partition.name)
+
+
+def test_partition_is_created_inside_a_transaction():
+    gameid = 2081
+    db.engine.execute(game_registry.insert(), gameid=gameid, season=2081)
+    _partitions.pop((team_box_score.name, 2081), None)
+    with db.engine.begin() as conn:
+        delete_game_rows(conn, gameid)
+    assert db.engine.has_table("team_box_score_2081")
+
+
+def test_view_created_by_another_worker_meanwhile():
+    raced = []
+
+    def race(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('CREATE VIEW team_box_score_all ') \
+                and not raced:
+            raced.append(True)
+            other = db.engine.connect()
+            other.execute(statement)
+            other.close()
+
+    event.listen(db.engine, 'before_cursor_execute', race)
+    try:
+        season_partition(db.engine, team_box_score, 2082)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', race)
+    assert raced
+    assert "team_box_score_2082" in str(db.engine.execute(
+        "SELECT sql FROM sqlite_master WHERE name = 'team_box_score_all'"
+    ).scalar())
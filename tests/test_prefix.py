@@ -0,0 +1,111 @@
+import numpy as np
+
+from db import STAT_COLUMNS
+from playbyplay import EVENT
+from prefix import PrefixSumIndex, window_totals
+
+
+def _running(tmpdir):
+    """Running totals of one stat: a point every second for ten seconds, on
+    a read-only memmap like `SnapshotDataset` blocks."""
+    path = str(tmpdir.join('totals.dat'))
+    totals = np.memmap(path, dtype=np.float64, mode='w+', shape=(10, 1))
+    totals[:, 0] = np.arange(10)
+    totals.flush()
+    return np.memmap(path, dtype=np.float64, mode='r', shape=(10, 1))
+
+
+def test_windows(tmpdir):
+    totals = _running(tmpdir)
+    assert window_totals(totals, 3, [5])[:, 0].tolist() == [3]
+    # Reaching back before tip-off, and past the final buzzer.
+    assert window_totals(totals, 3, [1, 20])[:, 0].tolist() == [1, 0]
+    assert window_totals(totals, 3)[:, 0].tolist() == \
+        [0, 1, 2, 3, 3, 3, 3, 3, 3, 3]
+
+
+def test_windows_ending_before_tip_off_are_empty(tmpdir):
+    totals = _running(tmpdir)
+    assert window_totals(totals, 3, [-5, -1, 0])[:, 0].tolist() == [0, 0, 0]
+    assert window_totals(totals, 120, [-5])[:, 0].tolist() == [0]
+    assert window_totals(totals, 3, -5)[0] == 0
+    assert totals[:, 0].tolist() == list(range(10))
+
+
+def _snapshot_at(rows, team, second):
+    """The team's row of the last snapshot at or before `second`."""
+    latest = {}
+    for row in sorted(rows, key=lambda row: (row['quarter'],
+                                             row['elapsed_seconds'])):
+        if row['team'] == team and row['elapsed_seconds'] <= second:
+            latest = row
+    return latest
+
+
+def test_index_is_forward_filled(synthetic_game):
+    game = synthetic_game(writer={'granularity': EVENT})
+    index = game.prefix_index()
+    snapshots = set(row['elapsed_seconds'] for row in game.team_rows)
+    assert len(snapshots) < len(index)
+    for team in index.keys:
+        for second in range(0, len(index), 7):
+            row = _snapshot_at(game.team_rows, team, second)
+            assert index.total(team, -1, second) == dict(
+                (column, row[column] or 0) for column in index.columns)
+
+
+def test_later_snapshot_of_a_second_wins(stored_game):
+    roster = {'cle': ['Cal Ames', 'Cal Bell', 'Cal Cole', 'Cal Dunn',
+                      'Cal Ford'],
+              'gs': ['Gus Ames', 'Gus Bell', 'Gus Cole', 'Gus Dunn',
+                     'Gus Ford']}
+    plays = [
+        [1, '6:00', 'cle', 2, 0, 'Cal Ames makes 10-foot jumper'],
+        [1, '0:00', 'cle', 4, 0, 'Cal Ames makes 10-foot jumper'],
+        [1, '0:00', 'cle', 4, 0, 'End of the 1st Quarter'],
+        [2, '12:00', 'gs', 4, 2, 'Gus Ames makes 10-foot jumper'],
+        [2, '6:00', 'gs', 4, 4, 'Gus Ames makes 10-foot jumper'],
+        [2, '0:00', 'gs', 4, 4, 'End of Game'],
+    ]
+    game = stored_game(plays, 'cle', 'gs', 'cle', roster,
+                       roster['cle'] + roster['gs'],
+                       writer={'granularity': EVENT})
+    end_of_first = [(row['quarter'], row['team'], row['PTS'])
+                    for row in game.team_rows if row['elapsed_seconds'] == 720]
+    assert sorted(end_of_first) == [
+        (1, 'cle', 4), (1, 'gs', 0), (2, 'cle', 4), (2, 'gs', 2)]
+    index = game.prefix_index()
+    assert index.total('gs', -1, 720)['PTS'] == 2
+    assert index.window('gs', 720, 1)['PTS'] == 2
+    assert index.window('cle', 720, 360)['PTS'] == 2
+
+
+def test_team_index_from_player_rows(synthetic_game):
+    game = synthetic_game(writer={'granularity': EVENT})
+    # Staged player rows carry no PIR; the writer sums it for team rows.
+    teams = PrefixSumIndex(game.team_rows, columns=STAT_COLUMNS)
+    players = PrefixSumIndex(game.rows, 'team', columns=STAT_COLUMNS)
+    assert players.keys == teams.keys == sorted([game.home, game.away])
+    assert players.sums.any()
+    assert np.array_equal(players.sums, teams.sums)
+    assert np.array_equal(players.rolling(120), teams.rolling(120))
+
+
+def test_rolling_matches_window(synthetic_game):
+    game = synthetic_game(writer={'granularity': 30})
+    index = game.prefix_index()
+    at = list(index.elapsed) + [-30, 10, len(index) + 600]
+    rolling = index.rolling(300, at)
+    for i, end in enumerate(at):
+        for k, team in enumerate(index.keys):
+            assert dict(zip(index.columns, rolling[i, k])) == \
+                index.window(team, end, 300)
+    assert rolling.any()
+
+
+def test_index_of_no_snapshots():
+    index = PrefixSumIndex([])
+    assert len(index) == 0
+    assert index.rolling(300).shape == (0, 0, len(index.columns))
+    assert index.rolling(300, [0, 60]).shape == (2, 0, len(index.columns))
+    assert window_totals(np.zeros((0, 1)), 3, [5]).tolist() == [[0]]
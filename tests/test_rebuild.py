@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy import func, select
+
+import synthetic
+from db import (
+    db, game_registry, parsed_games, player_box_score_all, player_snapshots,
+    team_box_score_all,
+)
+from playbyplay import DATABASE, NORMALIZED, rebuild_season, reprocess
+
+
+WRITERS = [
+    {'granularity': 30},
+    {'granularity': 30, 'team_aggregation': DATABASE},
+    {'granularity': 30, 'team_aggregation': DATABASE,
+     'player_layout': NORMALIZED},
+]
+
+
+def _count(column, gameid):
+    return db.engine.execute(select([func.count()]).where(
+        column == gameid)).scalar()
+
+
+def _counts(gameid):
+    return (_count(team_box_score_all.c.gameid, gameid),
+            _count(player_box_score_all.c.gameid, gameid),
+            _count(player_snapshots.c.gameid, gameid))
+
+
+def _stale(gameid):
+    db.engine.execute(parsed_games.update().where(
+        parsed_games.c.gameid == gameid).values(
+        rules_hash='stale', stats_digest='stale'))
+
+
+@pytest.mark.parametrize('case', range(len(WRITERS)))
+def test_rebuild_keeps_the_written_options(synthetic_game, case):
+    writer = WRITERS[case]
+    season = 2090 + case
+    gameid = synthetic.FIRST_GAMEID + 500000 + season
+    db.engine.execute(game_registry.insert(), gameid=gameid, season=season)
+    game = synthetic_game(gameid=gameid, writer=writer)
+    game.write()
+    written = _counts(gameid)
+    assert written[0]
+
+    rebuild_season(season)
+    assert _counts(gameid) == written
+
+    _stale(gameid)
+    reprocess(processes=1)
+    assert _counts(gameid) == written
+    stored = db.engine.execute(select([parsed_games]).where(
+        parsed_games.c.gameid == gameid)).first()
+    for option, value in writer.items():
+        assert stored[option] == str(value)
+
+
+def test_games_written_before_options_were_recorded(synthetic_game):
+    game = synthetic_game()
+    game.write()
+    written = _counts(game.gameid)
+    db.engine.execute(parsed_games.update().where(
+        parsed_games.c.gameid == game.gameid).values(
+        granularity=None, team_aggregation=None, player_layout=None))
+    _stale(game.gameid)
+    reprocess(processes=1)
+    assert _counts(game.gameid) == written
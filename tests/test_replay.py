@@ -0,0 +1,54 @@
+import pytest
+
+import realtime
+import replay
+from db import db
+
+
+def _per_rows():
+    if not db.engine.has_table('PER_data'):
+        return 0
+    return db.engine.execute('SELECT COUNT(*) FROM "PER_data"').scalar()
+
+
+def test_replay_reports_pipeline_throughput(synthetic_game, capsys,
+                                            monkeypatch):
+    game = synthetic_game(overtimes=0)
+    players = sum(len(names) for names in game.roster.values())
+    add_per = realtime.add_per
+    calls = []
+
+    def first_poll_fails(stats):
+        calls.append(stats)
+        if len(calls) == 1:
+            raise ZeroDivisionError("no made shots yet")
+        return add_per(stats)
+    monkeypatch.setattr(realtime, 'add_per', first_poll_fails)
+    feed_url = realtime.FEED_URL
+    before = _per_rows()
+
+    counts = replay.run([game.gameid], speed=1000, interval=0.05, write=True)
+    assert realtime.FEED_URL == feed_url
+    assert counts['polls'] == len(calls) >= 2
+    assert counts['errors'] >= 1
+    succeeded = counts['polls'] - counts['errors']
+    assert counts['rows'] == succeeded * players
+    assert _per_rows() - before == counts['rows']
+    assert 1 <= counts['pushed'] <= succeeded
+    report = capsys.readouterr().out
+    assert "{} polls ({} failed)".format(
+        counts['polls'], counts['errors']) in report
+    assert "rows written/s" in report
+    assert "snapshots pushed/s" in report
+
+
+def test_replay_stops_on_other_errors(synthetic_game, monkeypatch):
+    game = synthetic_game(overtimes=0)
+    feed_url = realtime.FEED_URL
+
+    def broken(stats):
+        raise KeyError('PTS')
+    monkeypatch.setattr(realtime, 'add_per', broken)
+    with pytest.raises(KeyError):
+        replay.run([game.gameid], speed=3000, interval=0.05)
+    assert realtime.FEED_URL == feed_url
@@ -0,0 +1,35 @@
+import os
+
+import fetch
+import synthetic
+from playbyplay import PlayByPlayToBoxScoreWriter
+
+
+def test_stress_counts_failed_games(monkeypatch, capsys, new_gameids):
+    first, failing, last = new_gameids(3)
+    compute = PlayByPlayToBoxScoreWriter.compute
+
+    def flaky(self):
+        if self.gameid == failing:
+            raise KeyError('Nobody')
+        return compute(self)
+    monkeypatch.setattr(PlayByPlayToBoxScoreWriter, 'compute', flaky)
+    synthetic.stress(games=3, report=3, overtimes=0, first_gameid=first)
+    report = capsys.readouterr().out
+    assert "Game {} failed: KeyError".format(failing) in report
+    assert "1 of 3 games failed" in report
+    assert "       3 games" in report
+
+
+def test_stress_writes_the_same_games_again(capsys, new_gameids):
+    gameid, = new_gameids()
+    scheduler = fetch.get_scheduler()
+    uri = os.environ['NBA_DB_URI']
+    for run in range(2):
+        synthetic.stress(games=1, report=1, overtimes=0, write=True,
+                         first_gameid=gameid)
+        report = capsys.readouterr().out
+        assert "       1 games" in report
+        assert "0 failed" in report
+    assert fetch.get_scheduler() is scheduler
+    assert os.environ['NBA_DB_URI'] == uri
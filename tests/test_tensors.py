@@ -0,0 +1,28 @@
+import numpy as np
+
+from db import db, parsed_games
+from tensors import SnapshotDataset, export
+
+
+def test_game_missing_from_parsed_games(synthetic_game, tmpdir):
+    game = synthetic_game(overtimes=0)
+    game.write()
+    export(str(tmpdir.join('parsed')), gameids=[game.gameid])
+    db.engine.execute(parsed_games.delete().where(
+        parsed_games.c.gameid == game.gameid))
+    export(str(tmpdir.join('legacy')), gameids=[game.gameid])
+
+    parsed = SnapshotDataset(str(tmpdir.join('parsed')))
+    legacy = SnapshotDataset(str(tmpdir.join('legacy')))
+    assert len(legacy) == 1
+    assert legacy.index.tolist() == parsed.index.tolist()
+    assert np.array_equal(legacy.game(game.gameid), parsed.game(game.gameid))
+
+
+def test_export_of_no_games(tmpdir):
+    path = str(tmpdir.join('empty'))
+    shape = export(path, gameids=[-1])
+    assert shape[0] == 0
+    dataset = SnapshotDataset(path)
+    assert len(dataset) == 0
+    assert list(dataset.batches(4)) == []
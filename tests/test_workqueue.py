@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy import select
+
+from db import db, team_box_score_all, work_queue
+from workqueue import CLAIMED, DONE, FAILED, LeaseLost, WorkQueue
+
+
+def _row(gameid):
+    return db.engine.execute(select([work_queue]).where(
+        work_queue.c.gameid == gameid)).first()
+
+
+def test_last_expired_claim_is_failed():
+    gameid = 1
+    WorkQueue(db.engine).enqueue([gameid])
+    dead = WorkQueue(db.engine, owner='dead', lease=-1, max_attempts=1)
+    assert dead.claim() == gameid
+    assert _row(gameid).status == CLAIMED
+
+    assert WorkQueue(db.engine, owner='next', max_attempts=1).claim() is None
+    assert _row(gameid).status == FAILED
+
+
+def test_expired_claim_writes_nothing(synthetic_game):
+    game = synthetic_game()
+    queue = WorkQueue(db.engine, owner='slow', lease=-1)
+    queue.enqueue([game.gameid])
+    assert queue.claim() == game.gameid
+    reclaimer = WorkQueue(db.engine, owner='reclaimer')
+    assert reclaimer.claim() == game.gameid
+
+    with pytest.raises(LeaseLost):
+        game.write(guard=lambda conn: queue.complete(game.gameid, conn))
+    assert not db.engine.execute(select([team_box_score_all]).where(
+        team_box_score_all.c.gameid == game.gameid)).first()
+    assert _row(game.gameid).owner == 'reclaimer'
+
+    game.write(guard=lambda conn: reclaimer.complete(game.gameid, conn))
+    assert _row(game.gameid).status == DONE
+    assert db.engine.execute(select([team_box_score_all]).where(
+        team_box_score_all.c.gameid == game.gameid)).first()
@@ -1,6 +1,24 @@
+import re
+import sys
+from multiprocessing.pool import ThreadPool
+
+from sqlalchemy import func, select
+
+from db import db, crawled_schedules, game_registry, insert_ignore
+from fetch import FetchError
 from playbyplay import make_soup
 
 
+FIRST_SEASON = 2007
+LAST_SEASON = 2016
+TEAMS_PER_SEASON = 30
+CONCURRENCY = 8
+
+
+def team_abbreviation(url):
+    return re.findall('/name/(\w+)', url)[0]
+
+
 def team_links(year):
     url = "http://www.espn.com/nba/team/schedule/_/name/atl/year/{}/seasontype/2".format(year)
     soup = make_soup(url)
@@ -9,26 +27,93 @@ def team_links(year):
             for option in options[1:]]
 
 
-def game_ids(url):
-    soup = make_soup(url)
-    links = [li.find('a').attrs['href'].split('/')[-1]
-             for li in soup.findAll("li", "score")]
-    return set(links)
-
-
-def get_all_game_ids():
-    gameids = set()
-    for year in range(2007, 2017):
-        print(year)
-        print("*" * 10)
-        urls = team_links(year)
-        for url in urls:
-            print(url)
-            gameids.update(game_ids(url))
-        with open("gameids.txt", "a") as f:
-            f.write(",".join(sorted(gameids)))
-            f.write(",")
-        gameids = set()
-
-
-get_all_game_ids()
+def schedule_games(season, url):
+    """Returns a registry row for every played game on a team's schedule."""
+    team = team_abbreviation(url)
+    games = []
+    for row in make_soup(url).findAll("tr"):
+        score = row.find("li", "score")
+        opponent = row.find("li", "team-name")
+        if score is None or opponent is None:
+            continue
+        status = row.find("li", "game-status").text.strip()
+        other = team_abbreviation(opponent.find('a').attrs['href'])
+        home, away = (team, other) if status == 'vs' else (other, team)
+        games.append({
+            "gameid": int(score.find('a').attrs['href'].split('/')[-1]),
+            "season": season,
+            "date": row.find("td").text.strip(),
+            "home": home,
+            "away": away,
+        })
+    return season, team, games
+
+
+def _crawl(args):
+    """A schedule's games, or None for them if its page couldn't be fetched,
+    so one bad page doesn't stop the crawl."""
+    season, url = args
+    try:
+        return schedule_games(season, url)
+    except FetchError as e:
+        print("Could not fetch schedule {}: {}".format(url, e))
+        return season, team_abbreviation(url), None
+
+
+def covered_seasons():
+    query = select([crawled_schedules.c.season]).group_by(
+        crawled_schedules.c.season).having(
+        func.count() >= TEAMS_PER_SEASON)
+    return set(row[0] for row in db.engine.execute(query))
+
+
+def covered_teams(season):
+    query = select([crawled_schedules.c.team]).where(
+        crawled_schedules.c.season == season)
+    return set(row[0] for row in db.engine.execute(query))
+
+
+def pending_schedules(seasons, refresh=()):
+    """Schedule pages for the teams and seasons not yet in the registry."""
+    covered = covered_seasons() - set(refresh)
+    pending = []
+    for season in seasons:
+        if season in covered:
+            continue
+        done = set() if season in refresh else covered_teams(season)
+        pending += [(season, url) for url in team_links(season)
+                    if team_abbreviation(url) not in done]
+    return pending
+
+
+def crawl(seasons, refresh=(), concurrency=CONCURRENCY):
+    """Crawl missing team schedules `concurrency` pages at a time, recording
+    each schedule as covered once its games are in the registry. Schedules
+    that fail stay uncovered, so the next crawl tries them again."""
+    pending = pending_schedules(seasons, refresh)
+    print("Crawling {} schedules".format(len(pending)))
+    failed = 0
+    pool = ThreadPool(concurrency)
+    try:
+        for season, team, games in pool.imap_unordered(_crawl, pending):
+            if games is None:
+                failed += 1
+                continue
+            insert_ignore(db.engine, game_registry, games)
+            insert_ignore(db.engine, crawled_schedules,
+                          [{"season": season, "team": team}])
+            print("{} {}: {} games".format(season, team, len(games)))
+    finally:
+        pool.close()
+        pool.join()
+    if failed:
+        print("{} of {} schedules failed; crawl again to retry them".format(
+            failed, len(pending)))
+
+
+if __name__ == '__main__':
+    """Usage: python valid_gameids.py [first_season] [last_season] [refresh]"""
+    first = int(sys.argv[1]) if len(sys.argv) > 1 else FIRST_SEASON
+    last = int(sys.argv[2]) if len(sys.argv) > 2 else LAST_SEASON
+    seasons = range(first, last + 1)
+    crawl(seasons, refresh=seasons if 'refresh' in sys.argv else ())
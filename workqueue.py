@@ -0,0 +1,167 @@
+"""A database-backed queue of gameids shared by backfill workers.
+
+Workers on any number of machines claim games by setting a lease on a row of
+the `work_queue` table. The lease is renewed by a heartbeat while the game is
+processed, and a game whose lease runs out (the worker died or hung) is
+claimed by the next worker that asks. Claims use a conditional UPDATE, so the
+only coordination needed is the database every worker already writes to.
+"""
+import os
+import random
+import socket
+import threading
+import time
+
+from sqlalchemy import and_, case, or_, select
+
+from db import insert_ignore, work_queue
+
+
+PENDING = 'pending'
+CLAIMED = 'claimed'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class LeaseLost(Exception):
+    """The worker's claim on a game ran out and may be held by another."""
+
+
+class WorkQueue(object):
+    """
+    :param lease: seconds a claim is valid without a heartbeat.
+    :param max_attempts: claims before a failing game is given up on.
+    """
+
+    def __init__(self, engine, owner=None, lease=300, heartbeat=60,
+                 max_attempts=3):
+        self.engine = engine
+        self.owner = owner or "{}:{}".format(socket.gethostname(), os.getpid())
+        self.lease = lease
+        self.heartbeat_interval = heartbeat
+        self.max_attempts = max_attempts
+        self.held = set()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.heartbeat_thread = None
+
+    def enqueue(self, gameids):
+        insert_ignore(self.engine, work_queue, [
+            {"gameid": gameid, "status": PENDING, "attempts": 0}
+            for gameid in gameids])
+
+    def _claimable(self, now):
+        return and_(work_queue.c.attempts < self.max_attempts, or_(
+            work_queue.c.status == PENDING,
+            and_(work_queue.c.status == CLAIMED,
+                 work_queue.c.lease_expires < now)))
+
+    def _expire(self, now):
+        """Fails the games whose last allowed claim ran out, which would
+        otherwise stay claimed by a dead worker forever."""
+        self.engine.execute(work_queue.update().where(and_(
+            work_queue.c.status == CLAIMED,
+            work_queue.c.lease_expires < now,
+            work_queue.c.attempts >= self.max_attempts)).values(
+            status=FAILED, lease_expires=None,
+            error="lease ran out on the last attempt"))
+
+    def claim(self, candidates=20):
+        """Returns a claimed gameid, or None when no work is left.
+
+        Workers pick randomly among the first `candidates` claimable games so
+        that nodes asking at the same moment rarely race for the same row.
+        """
+        self._expire(time.time())
+        while True:
+            now = time.time()
+            query = select([work_queue.c.gameid]).where(
+                self._claimable(now)).order_by(
+                work_queue.c.gameid).limit(candidates)
+            gameids = [row[0] for row in self.engine.execute(query)]
+            if not gameids:
+                return None
+            random.shuffle(gameids)
+            for gameid in gameids:
+                result = self.engine.execute(work_queue.update().where(
+                    and_(work_queue.c.gameid == gameid,
+                         self._claimable(now))).values(
+                    status=CLAIMED, owner=self.owner,
+                    lease_expires=now + self.lease,
+                    attempts=work_queue.c.attempts + 1))
+                if result.rowcount == 1:
+                    with self.lock:
+                        self.held.add(gameid)
+                    return gameid
+
+    def _finish(self, gameid, **values):
+        self.engine.execute(work_queue.update().where(and_(
+            work_queue.c.gameid == gameid,
+            work_queue.c.owner == self.owner)).values(**values))
+        with self.lock:
+            self.held.discard(gameid)
+
+    def complete(self, gameid, conn=None):
+        """Marks a game done, raising `LeaseLost` if this worker no longer
+        holds it. Pass the connection of the transaction writing the game's
+        rows to do this first in it: a worker whose lease ran out then
+        writes nothing, and the row lock taken here keeps it from writing at
+        the same time as the worker that reclaimed the game."""
+        result = (conn or self.engine).execute(work_queue.update().where(
+            and_(work_queue.c.gameid == gameid,
+                 work_queue.c.owner == self.owner,
+                 work_queue.c.status == CLAIMED)).values(
+            status=DONE, lease_expires=None))
+        with self.lock:
+            self.held.discard(gameid)
+        if result.rowcount != 1:
+            raise LeaseLost("{} no longer holds game {}".format(
+                self.owner, gameid))
+
+    def fail(self, gameid, error, retry=True):
+        """Releases a game back to the queue, or marks it failed for good."""
+        status = FAILED
+        if retry:
+            status = case([(work_queue.c.attempts >= self.max_attempts,
+                            FAILED)], else_=PENDING)
+        self._finish(gameid, status=status, lease_expires=None,
+                     error=str(error))
+
+    def renew(self):
+        with self.lock:
+            held = list(self.held)
+        if not held:
+            return
+        self.engine.execute(work_queue.update().where(and_(
+            work_queue.c.gameid.in_(held),
+            work_queue.c.owner == self.owner)).values(
+            lease_expires=time.time() + self.lease))
+
+    def _heartbeat(self):
+        while not self.stopped.wait(self.heartbeat_interval):
+            try:
+                self.renew()
+            except Exception as e:
+                print("Lease renewal failed: {}".format(e))
+
+    def start(self):
+        self.heartbeat_thread = threading.Thread(target=self._heartbeat)
+        self.heartbeat_thread.daemon = True
+        self.heartbeat_thread.start()
+
+    def stop(self):
+        """Stops the heartbeat and hands back anything still claimed."""
+        self.stopped.set()
+        if self.heartbeat_thread is not None:
+            self.heartbeat_thread.join()
+        with self.lock:
+            held = list(self.held)
+        for gameid in held:
+            self.fail(gameid, "worker {} stopped".format(self.owner))
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()